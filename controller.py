@@ -1,14 +1,25 @@
 import time
 import sys
-import json
 import datetime
-import random
-import dateparser
+import threading
 from pathlib import Path
 from googleapiclient.errors import HttpError
 
-from daily_search import Searcher
-import playwright_scrape as pws
+from daily_search import Searcher, PAGE_FANOUT
+import results_journal as rj
+from page_store import open_store
+from query_space import QueryPlanner
+from scrape_stage import scrape_many, ScraperThreads, ScraperProcesses, RoutedPool, WorkerKilled, SCRAPE_WORKERS, PER_HOST
+from pdf_extract import PdfPipeline, PDF_WORKERS
+from static_fetch import STATS as TIER_STATS
+from domain_memory import DomainMemory
+from html_archive import HtmlArchive
+from playwright_scrape import BROWSER_CACHE_DIR
+from scrape_queue import ScrapeQueue, MAX_ATTEMPTS
+from url_index import SeenURLs
+from relevance import gate, gate_score, load_config as load_gate_config
+from cse_cache import CacheMiss
+from quota import QuotaScheduler, is_quota_error, PER_MINUTE
 
 __version__ = "1.1.0"
 __copyright__ = "Copyright (C) 2023 GivingTuesday"
@@ -16,71 +27,84 @@ __license__ = "MIT"
 __author__ = "Marc Maxmeister"
 __author_email__ = "marc@givingtuesday.org"
 
-RESULTS_FILE = Path('data', 'results.json')
-PAGES_FILE = Path('data', 'pages.json') # dict keyed to urls in results
+RESULTS_FILE = rj.RESULTS_JOURNAL # one search per line; see results_journal.py
+PAGES_DIR = Path('data', 'pages') # PageStore keyed to urls in results; see page_store.py
+QUEUE_FILE = Path('data', 'scrape_queue.db') # links waiting for the scrape stage
+SEEN_FILE = Path('data', 'seen_urls.txt') # canonical form of every url fetched or queued
+VOCAB_POLL = 60 # seconds between vocabulary checks once every query has been used
 
 
-def main(wait=300, timeframe='d360', query_date=None, return_pages=1, incl_actors=True):
-    """
+def search_loop(wait=None, timeframe='d360', query_date=None, return_pages=1, incl_actors=True,
+                daily_quota=None, per_minute=PER_MINUTE, forever=False, searcher=None, offline=False,
+                page_fanout=PAGE_FANOUT):
+    """Producer: runs searches, saves each result to the journal and queues its links for scraping.
+    Searches are paced by quota.QuotaScheduler (daily_quota, per_minute, both per API key: the budget grows
+    with the number of keys in credentials.json; daily_quota defaults to the per-key limit the KeyPool uses,
+    GOOGLE_CSE_DAILY_LIMIT in credentials.json or 100); wait is an optional minimum number of seconds between searches.
+    One Searcher is kept for the whole run. Edits to data/vocab.json (and data/gate.json) are picked up
+    before each search; forever=True keeps running (waiting for new vocabulary) once every query is used.
     - dateRestrict="daterange:2020-10-01..2022-10-01" <-- not working
     - sort="date:r:20160101:20190101"
     - query_date: [within query] "after:<YYYY-MM-DD> before:<YYYY-MM-DD>"
-    pages: how many pages of results (default is 10 results, first page only)
+    pages: how many pages of results (default is 10 results, first page only); fewer are requested when
+      totalResults or a short page shows the rest would be empty
+    page_fanout: result pages requested at once (Searcher.search_pages)
+    offline: answer searches only from the CSE response cache (cse_cache); uncached queries are skipped
     """
-    for N in range(1000):
-        S = Searcher()
-        with open(RESULTS_FILE,'r') as f:
-            results = json.load(f)    
-            # keys: query, date, items (list of search results)
-
-        max_retries = 10000
-        retries = 0        
-        while True:            
-            # ensure always unique searches for now; 
-            # TODO: allow repeats after N days
-            actor = random.choice(S.actors)
-            term = random.choice(S.terms)
-            AI = None
-            if not incl_actors:
-                AI = random.choice(S.ai_synonyms)
-                #query = f"(AI OR 'ARTIFICIAL INTELLIGENCE') AND ({term}) inurl:.org"
-                # changed 2023-10-03
-                query = f"{AI} AND ({term}) AND (foundation OR organization)"
-            else:
-                query = f"((AI OR 'ARTIFICIAL INTELLIGENCE') AND {actor}) AND ({term})"
-                #query = f"{AI} AND {actor} AND ({term})"
-            if query_date:
-                query += query_date
-            if retries > max_retries:
-                print(f"Tried over 10,000 permutations and found no unique combinations. Aborting.")
-                break
-
-            if any([query in result['query'] for result in results]):
-                retries += 1
-                continue
-            else:
-                break
-        if retries > max_retries:
-            sys.exit()
+    rj.ensure_journal(RESULTS_FILE)
+    # keys: query, date, items (list of search results)
+    n_results = rj.count_results(RESULTS_FILE)
+    planner = None
+    page_store = open_store(PAGES_DIR)
+    queue = ScrapeQueue(QUEUE_FILE)
+    seen = SeenURLs(SEEN_FILE, seed=page_store.keys())
+    S = searcher or Searcher(offline=offline, page_fanout=page_fanout)
+    n_keys = len(S.engine.keys) # daily_quota and per_minute are per API key; see quota.KeyPool
+    # one per-key daily limit for the pool and the scheduler: the KeyPool's unless daily_quota overrides it
+    daily_quota = S.engine.keys.daily_limit = daily_quota or S.engine.keys.daily_limit
+    scheduler = QuotaScheduler(daily_limit=daily_quota * n_keys, per_minute=per_minute * n_keys)
+    S.engine.on_request = scheduler.acquire # quota is spent only on requests the response cache can't answer
+    N = 0
+    while forever or N < 1000:
+        start = time.time()
+        if S.reload_vocab() or planner is None:
+            # new vocabulary means a new walk; the used-query set carries over
+            planner = QueryPlanner(S, incl_actors=incl_actors, query_date=query_date,
+                                   used=planner.used if planner else None)
+        gate_config = load_gate_config()
+        # ensure always unique searches for now; 
+        # TODO: allow repeats after N days
+        picked = planner.next_query()
+        if picked is None:
+            if not forever:
+                print(f"All {planner.size} combinations have been searched. Aborting.")
+                sys.exit()
+            print(f"All {planner.size} combinations have been searched; waiting for new vocabulary in {S.vocab_file}")
+            time.sleep(VOCAB_POLL)
+            continue
+        query, actor, term, AI = picked
 
         print(f"query: {query}")
-        try:
-            saved = []
-            for page in range(return_pages):
-                if timeframe is None:
-                    results_list, total_n = S.one_search(
-                        query=query,
-                        page=page)
-                else:
-                    results_list, total_n = S.one_search(                        
-                        query=query,
-                        page=page,
-                        dateRestrict=timeframe,)
-                saved.extend(results_list)
-        except HttpError as e:
-            print(f"googleapiclient.errors.HttpError: {e}")
-            print("QUITTING...")
-            sys.exit()
+        found = {} # page -> results, kept across quota retries so only missing pages are requested again
+        restrict = {} if timeframe is None else {'dateRestrict': timeframe}
+        while True:
+            try:
+                saved, total_n = S.search_pages(query, pages=return_pages, found=found, **restrict)
+            except CacheMiss:
+                break
+            except HttpError as e:
+                print(f"googleapiclient.errors.HttpError: {e}")
+                if is_quota_error(e):
+                    scheduler.backoff(e) # then retry the missing pages
+                    continue
+                print("QUITTING...")
+                sys.exit()
+            scheduler.succeeded()
+            break
+        if 0 not in found:
+            print("not in the response cache, skipped (offline)")
+            N += 1
+            continue
         today = str(datetime.date.today())
         # include the dates of the actual pages     
         missing_dates = 0   
@@ -99,48 +123,172 @@ def main(wait=300, timeframe='d360', query_date=None, return_pages=1, incl_actor
             result['ai'] = AI
         if incl_actors:
             result["actor"] = actor
-        results.append(result)
-        print(f"S-{N} < {len(result['items'])} saving #{len(results)} result > {missing_dates} no dates")
-        with open(RESULTS_FILE, "w") as f:
-            json.dump(results, f, indent=2)
-
-        ### PLAYWRIGHT SCRAPE ###
-        start = time.time() # subtract from the 5 min timeout
-        with open(PAGES_FILE, 'r') as f:
-            old_pages = json.load(f)
-        pages = {}
-        for item in result['items']:
+        rj.append_result(result, RESULTS_FILE)
+        planner.mark_used(query)
+        n_results += 1
+        print(f"S-{N} < {len(result['items'])} saving #{n_results} result > {missing_dates} no dates")
+
+        ### QUEUE FOR PLAYWRIGHT SCRAPE ###
+        page_store.refresh() # pages written by the scraper since the last search
+        seen.refresh()
+        kept, skipped = gate(result['items'], gate_config) # snippet-based relevance, best first
+        for reason, item in skipped:
+            print(f"xxx {item['link'][:80]} ({reason})")
+        queued = 0
+        for priority, item in kept:
             link = item["link"]
-            if link in old_pages:
+            if link in page_store:
                 print(f"--- {link}")
                 continue
-            print(f"[PW] {link[:80]}")
-            try:
-                content = pws.main(link)
-                pages[link] = content
-                pages[link]["date"] = today
-            except Exception as e:
-                print(f"PW Error: {e}")
-                
-        # old_pages is a large file; only save after each batch of 10 scrapes
-        old_pages.update(pages)
-        with open(PAGES_FILE, 'w') as f:
-            json.dump(old_pages, f, indent=1)
-        
-        newwait = wait - round((time.time() - start))
-
-        for remaining in range(newwait, 0, -1):
-            sys.stdout.write("\r")
-            sys.stdout.write("{:2d} seconds remaining.".format(remaining))
-            sys.stdout.flush()
-            time.sleep(1)
-        sys.stdout.write("\r                        \n")
+            if seen.already_seen(link): # an equivalent URL was fetched or queued, maybe in this same batch
+                print(f"=== {link}")
+                continue
+            queued += queue.put(link, priority=priority)
+            seen.add(link)
+        print(f"queued {queued} links, gated out {len(skipped)}; queue: {queue.counts()}; {seen.report()}")
+
+        print(f"quota: {scheduler.used_today()} of {scheduler.daily_limit} used today")
+        if wait: # optional fixed spacing on top of the quota budget
+            time.sleep(max(0, wait - (time.time() - start)))
+        N += 1
+
+
+def recover_unscraped(page_store=None, queue=None, seen=None):
+    """Startup recovery: re-queue links whose scrape was interrupted, and links from saved search results
+    that never made it into the page store (e.g. results saved before a crash mid-batch)."""
+    if page_store is None:
+        page_store = open_store(PAGES_DIR)
+    if queue is None:
+        queue = ScrapeQueue(QUEUE_FILE)
+    if seen is None:
+        seen = SeenURLs(SEEN_FILE, seed=page_store.keys())
+    released = queue.release_orphaned()
+    requeued = 0
+    gate_config = load_gate_config()
+    for search in rj.iter_results(RESULTS_FILE):
+        for item in search['items']:
+            link = item['link']
+            if link in page_store or link in seen:
+                continue # fetched or queued already, possibly under an equivalent URL
+            priority, reason = gate_score(item, gate_config)
+            if priority is None:
+                continue # the relevance gate skipped it when it was found
+            requeued += queue.put(link, priority=priority)
+            seen.add(link)
+    print(f"recovery: {released} interrupted scrapes released, {requeued} unscraped result links queued")
+    return released, requeued
+
+
+def scrape_loop(scrape_workers=SCRAPE_WORKERS, per_host=PER_HOST, batch=None, poll=10, forever=True, stop=None,
+                drain=None, pdf_workers=PDF_WORKERS, static_first=True, isolate=True, archive=True, browser_cache=False):
+    """Consumer: claims queued links, scrapes them concurrently and saves each page as it finishes.
+    static_first: try a plain HTTP fetch before the browser (static_fetch); the tier stats are printed per batch.
+    isolate: scrape in worker processes under a watchdog (scrape_stage.ScraperProcesses) instead of threads; a link
+    that runs past the deadline or crashes its worker is marked failed without retries.
+    archive: keep each page's HTML in data/html (html_archive) for re-extraction without re-scraping.
+    browser_cache: give each browser a persistent profile under data/browser_cache so CSS/JS bundles are reused
+    across pages of one site (request blocking is then limited to images; see playwright_scrape.Scraper).
+    Engine choice, wait budgets and skips of always-failing domains come from data/domain_memory.json (domain_memory).
+    PDFs (by extension, or pages the browser reports as a PDF download) are downloaded and read by pdf_workers processes.
+    Several scrape_loop processes can share one queue. With forever=False it returns once the queue is empty;
+    stop is an optional threading.Event that ends the loop after the current batch, and drain one that turns
+    forever off once set, so the loop returns when the queue is empty."""
+    page_store = open_store(PAGES_DIR)
+    queue = ScrapeQueue(QUEUE_FILE)
+    recover_unscraped(page_store, queue)
+    batch = batch or scrape_workers * 2
+    # one warm browser per worker for the whole loop (playwright_scrape.Scraper); PDFs go to a process pool
+    workers = ScraperProcesses if isolate else ScraperThreads
+    with DomainMemory() as memory, PdfPipeline(pdf_workers) as pdfs, \
+            workers(scrape_workers, static_first=static_first, memory=memory,
+                    archive=HtmlArchive() if archive else None,
+                    cache_dir=BROWSER_CACHE_DIR if browser_cache else None) as browsers:
+        pool = RoutedPool(browsers, pdfs)
+        while stop is None or not stop.is_set():
+            links = queue.claim(batch)
+            if not links:
+                if not forever or (drain is not None and drain.is_set()):
+                    break
+                time.sleep(poll)
+                continue
+            page_store.refresh()
+            for link in [link for link in links if link in page_store]: # saved just before a crash
+                queue.done(link)
+                links.remove(link)
+            today = str(datetime.date.today())
+            for link, content, error in scrape_many(links, per_host=per_host, pool=pool):
+                if error is not None:
+                    print(f"PW Error: {link[:80]} {error}")
+                    # a link that hung or crashed its worker is not retried
+                    queue.fail(link, error, max_attempts=1 if isinstance(error, WorkerKilled) else MAX_ATTEMPTS)
+                    continue
+                print(f"[PW] {link[:80]}")
+                content["date"] = today
+                page_store.put(link, content) # durable (fsync'd) before the queue marks it done
+                queue.done(link)
+            if static_first:
+                print(TIER_STATS.report())
+            if isolate:
+                print(browsers.report())
+
+
+def main(wait=None, timeframe='d360', query_date=None, return_pages=1, incl_actors=True,
+         scrape_workers=SCRAPE_WORKERS, per_host=PER_HOST, daily_quota=None, per_minute=PER_MINUTE,
+         forever=False, page_fanout=PAGE_FANOUT):
+    """Runs the search loop with a scrape loop alongside it in a background thread.
+    To scale or restart them separately, run `python controller.py search` and `python controller.py scrape`.
+    scrape_workers: browsers scraping a batch at once; per_host: most at once on one site
+    forever: see daemon()
+    When the search loop ends (every query used, 1000 searches, or an error) the scraper finishes the links
+    still queued before main returns; on Ctrl-C it only finishes its current batch. Either way its browsers,
+    PDF workers and domain memory are closed properly.
+    """
+    stop = threading.Event()
+    drain = threading.Event()
+    scraper = threading.Thread(target=scrape_loop, daemon=True,
+                               kwargs=dict(scrape_workers=scrape_workers, per_host=per_host, stop=stop, drain=drain))
+    scraper.start()
+    try:
+        search_loop(wait=wait, timeframe=timeframe, query_date=query_date,
+                    return_pages=return_pages, incl_actors=incl_actors,
+                    daily_quota=daily_quota, per_minute=per_minute, forever=forever, page_fanout=page_fanout)
+    except KeyboardInterrupt:
+        stop.set()
+        raise
+    finally:
+        if not stop.is_set():
+            print("search loop finished; scraping the links still queued")
+        drain.set()
+        scraper.join()
+
+
+def daemon(**kwargs):
+    """Long-running mode: one searcher, scraper and set of storage handles for the life of the process.
+    Vocabulary edits in data/vocab.json apply without a restart (`python daily_search.py export-vocab`
+    writes the built-in lists there to start from), and it idles instead of exiting when the space is used up."""
+    main(forever=True, **kwargs)
 
 if __name__ == '__main__':
-    main(timeframe='5y', 
-         query_date=" after:2020-10-01 before:2023-10-01",
-         return_pages=10,
-         incl_actors=False)
+    stage = sys.argv[1] if len(sys.argv) > 1 else 'both'
+    if stage == 'scrape':
+        scrape_loop()
+    elif stage == 'recover':
+        recover_unscraped()
+    elif stage == 'daemon':
+        daemon(timeframe='5y', 
+               query_date=" after:2020-10-01 before:2023-10-01",
+               return_pages=10,
+               incl_actors=False)
+    elif stage == 'search':
+        search_loop(timeframe='5y', 
+             query_date=" after:2020-10-01 before:2023-10-01",
+             return_pages=10,
+             incl_actors=False)
+    else:
+        main(timeframe='5y', 
+             query_date=" after:2020-10-01 before:2023-10-01",
+             return_pages=10,
+             incl_actors=False)
 
 """ FIXES
 # had to restructure json
@@ -191,6 +339,7 @@ def fix_results_before():
     with open("data/results.json",'w') as f:
         json.dump(results, f, indent=2)
 
+# superseded by `python fast_dates.py backfill [workers]` (data/results.jsonl, all cores)
 def fix_missing_dateparser():
     import json
     import dateparser
@@ -218,7 +367,7 @@ def fix_missing_dateparser():
 ver 1.1 -- saves all results, but scores 1 if keywords in title; otherwise score 0.
 (needed because the search terms are increasingly long phrases not expected in title)
 ADDED FEATURES
--- download PDFs instead of scraping with `net::ERR_ABORTED`
+-- download PDFs instead of scraping with `net::ERR_ABORTED` (done: pdf_extract.py)
 
 Changes for broader .org search: 
 getting 40 results, not 10
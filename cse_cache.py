@@ -0,0 +1,169 @@
+"""
+On-disk cache of raw CSE responses, under google_search.GoogleSearch.search_google.
+
+Responses are keyed by the request parameters that change the answer (q, cx, lr, dateRestrict,
+sort, fileType, start, num, fields; never the API key), with q's whitespace normalized, and stored
+gzipped as data/cse_cache/ab/<sha256>.json.gz. Entries older than the TTL are refetched, and the
+least recently used entries are evicted once the cache passes max_mb.
+
+In offline mode search_google answers only from the cache (any age) and raises CacheMiss
+otherwise, so changes to process_search_results can be re-run over past searches without quota:
+
+    python cse_cache.py stats
+    python cse_cache.py replay     # every cached response through process_search_results
+    python cse_cache.py purge      # drop entries older than the TTL
+"""
+import os
+import sys
+import gzip
+import json
+import time
+import hashlib
+import threading
+from pathlib import Path
+
+CACHE_DIR = Path('data', 'cse_cache')
+TTL = 7 * 24 * 3600 # seconds
+MAX_MB = 200
+KEY_PARAMS = ('q', 'cx', 'lr', 'dateRestrict', 'sort', 'fileType', 'start', 'num', 'fields')
+
+
+class CacheMiss(Exception):
+    """Offline mode and the request is not cached."""
+
+
+def normalize(params):
+    """The cache-relevant part of a CSE request, e.g. {'q': 'a  b', 'key': ...} -> {'q': 'a b'}"""
+    key = {name: str(params[name]) for name in KEY_PARAMS if params.get(name) is not None}
+    if 'q' in key:
+        key['q'] = ' '.join(key['q'].split())
+    if key.get('start') == '1':
+        key.pop('start') # the first page, same as no start
+    return key
+
+
+class ResponseCache():
+
+    def __init__(self, root=CACHE_DIR, ttl=TTL, max_mb=MAX_MB):
+        self.root = Path(root)
+        self.ttl = ttl
+        self.max_bytes = max_mb * 1024 * 1024
+        self.lock = threading.Lock()
+        self.hits = self.misses = 0
+        self._size = None # bytes on disk, computed on the first put
+
+    def path(self, params):
+        digest = hashlib.sha256(json.dumps(normalize(params), sort_keys=True).encode('utf-8')).hexdigest()
+        return self.root / digest[:2] / f"{digest}.json.gz"
+
+    def get(self, params, ttl=None):
+        """The cached response, or None if missing or older than ttl (default self.ttl; -1 means any age)."""
+        ttl = self.ttl if ttl is None else ttl
+        path = self.path(params)
+        try:
+            entry = self._read(path)
+            if ttl >= 0 and time.time() - entry['time'] > ttl:
+                raise FileNotFoundError
+            os.utime(path) # mtime tracks the last use, for eviction
+        except (FileNotFoundError, OSError, ValueError):
+            with self.lock:
+                self.misses += 1
+            return None
+        with self.lock:
+            self.hits += 1
+        return entry['response']
+
+    def put(self, params, response):
+        path = self.path(params)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with gzip.open(tmp, 'wt', encoding='utf-8') as f:
+            json.dump({'params': normalize(params), 'time': time.time(), 'response': response}, f)
+        size = tmp.stat().st_size
+        os.replace(tmp, path)
+        with self.lock:
+            if self._size is None:
+                self._size = self.size()
+            else:
+                self._size += size
+            if self._size > self.max_bytes:
+                self._size -= self.evict(self.max_bytes * 0.9)
+
+    def _read(self, path):
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _files(self):
+        return list(self.root.glob('*/*.json.gz')) if self.root.exists() else []
+
+    def size(self):
+        return sum(path.stat().st_size for path in self._files())
+
+    def evict(self, target_bytes):
+        """Delete least recently used entries until the cache is under target_bytes. Returns bytes freed."""
+        files = sorted(((path.stat().st_mtime, path.stat().st_size, path) for path in self._files()))
+        total = sum(size for _, size, _ in files)
+        freed = 0
+        for _, size, path in files:
+            if total - freed <= target_bytes:
+                break
+            path.unlink(missing_ok=True)
+            freed += size
+        return freed
+
+    def purge(self):
+        """Delete entries older than the TTL. Returns how many."""
+        removed = 0
+        for path in self._files():
+            try:
+                expired = time.time() - self._read(path)['time'] > self.ttl
+            except (OSError, ValueError):
+                expired = True
+            if expired:
+                path.unlink(missing_ok=True)
+                removed += 1
+        return removed
+
+    def entries(self):
+        """Every cached (params, response, time written)."""
+        for path in self._files():
+            try:
+                entry = self._read(path)
+            except (OSError, ValueError):
+                continue
+            yield entry['params'], entry['response'], entry['time']
+
+    def report(self):
+        lookups = self.hits + self.misses
+        rate = f" ({100 * self.hits / lookups:.0f}% hits)" if lookups else ''
+        return f"cse cache: {self.hits} hits, {self.misses} misses{rate}"
+
+
+def replay(cache=None):
+    """Yield (params, processed) for every cached response, oldest first, run through the current
+    GoogleSearch.process_search_results."""
+    from google_search import GoogleSearch
+    cache = cache or ResponseCache()
+    for params, response, _ in sorted(cache.entries(), key=lambda entry: entry[2]):
+        try:
+            yield params, GoogleSearch.process_search_results(response)
+        except Exception as e:
+            print(f"replay: {params.get('q')} failed: {e}")
+
+
+if __name__ == '__main__':
+    command = sys.argv[1] if len(sys.argv) > 1 else 'stats'
+    cache = ResponseCache()
+    if command == 'stats':
+        files = cache._files()
+        print(f"{len(files)} cached responses, {cache.size() / 1e6:.1f} MB in {cache.root}")
+    elif command == 'purge':
+        print(f"removed {cache.purge()} entries older than {cache.ttl}s")
+    elif command == 'replay':
+        n = items = 0
+        for params, processed in replay(cache):
+            n += 1
+            items += len(processed['items'])
+        print(f"replayed {n} responses, {items} items")
+    else:
+        print("usage: python cse_cache.py [stats|purge|replay]")
@@ -5,15 +5,30 @@ __version__ = "1.1.0"
 __license__ = "MIT"
 __author__ = "Marc Maxmeister"
 
+import os
+import json
+import math
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 import google_search
+from cse_cache import CacheMiss
 from pprint import pprint
 
+VOCAB_FILE = Path('data', 'vocab.json') # optional; overrides the built-in lists below
+VOCAB_KEYS = ('actors', 'terms', 'ai_synonyms')
+PAGE_SIZE = 10 # results per CSE page
+MAX_PAGES = 10 # CSE serves at most the first 100 results
+PAGE_FANOUT = 3 # result pages requested at once
+
 # call this once every 15 minutes for ~ 100 per day of free searches
 class Searcher():
 
     def __init__(self, **kw):
         # API KEY found at https://console.cloud.google.com/apis/credentials?project=<projectname>
-        self.engine = google_search.GoogleSearch()
+        # cse_cache=False turns off the response cache; offline=True answers only from it
+        self.engine = google_search.GoogleSearch(cache=kw.get('cse_cache', True), offline=kw.get('offline', False))
+        self.page_fanout = kw.get('page_fanout', PAGE_FANOUT) # see search_pages
+        self.page_pool = None # threads for pages after the first, created on first use
         #self.source = pd.read_csv('ai-terms-actors-taxonomy.csv')
         # strip out text from members count. attendance column is already numeric.
         # self.source['MEMBERS'] = self.source['MEMBERS'].replace('(\D+)',0, regex=True).astype('int')
@@ -114,6 +129,42 @@ class Searcher():
         # useful: "receives funding" 
         # facial recognition, big data, reinforcement learning, 
         self.kwargs = kw
+        self.vocab_file = Path(kw.get('vocab_file', VOCAB_FILE))
+        self._vocab_mtime = None
+        self.reload_vocab()
+
+    def vocab(self):
+        return {key: list(getattr(self, key)) for key in VOCAB_KEYS}
+
+    def reload_vocab(self):
+        """Load actors/terms/ai_synonyms from vocab_file if it changed since the last load.
+        Keys missing from the file keep their current lists. Returns True if anything changed."""
+        try:
+            mtime = os.stat(self.vocab_file).st_mtime
+        except FileNotFoundError:
+            return False
+        if mtime == self._vocab_mtime:
+            return False
+        try:
+            with open(self.vocab_file, 'r') as f:
+                data = json.load(f)
+        except (ValueError, OSError) as e:
+            print(f"vocab: could not read {self.vocab_file} ({e}); keeping current lists")
+            return False # retried on the next call, e.g. once the editor finishes writing
+        self._vocab_mtime = mtime
+        before = self.vocab()
+        for key in VOCAB_KEYS:
+            if isinstance(data.get(key), list) and data[key]:
+                setattr(self, key, data[key])
+        changed = self.vocab() != before
+        if changed:
+            print(f"vocab: loaded {self.vocab_file} " + ', '.join(f"{len(getattr(self, key))} {key}" for key in VOCAB_KEYS))
+        return changed
+
+    def save_vocab(self, path=None):
+        """Write the current lists to a vocab file, as a starting point for editing."""
+        with open(path or self.vocab_file, 'w') as f:
+            json.dump(self.vocab(), f, indent=2)
 
     def one_search(self, query=None, debug=False, **kwargs):
         #  check_if_already_done=True, --- moved to controller.main()
@@ -130,7 +181,68 @@ class Searcher():
             pass
         return saved, results['total_results']
 
+    def search_pages(self, query, pages=1, found=None, **kwargs):
+        """Pages 0..pages-1 of query, up to page_fanout requests in flight at once. Returns (items in page order,
+        total_results). The first page is fetched alone: its totalResults caps the page count, and nothing
+        more is requested after a page comes back short (fewer than PAGE_SIZE items), so no quota goes on pages
+        that would be empty.
+        found: dict of page -> (items, total_results) filled in as pages arrive. If a request raises (e.g. a
+        quota error), the exception propagates once the pages in flight are done; call again with the same
+        dict after backing off and only the missing pages are requested. In offline mode an uncached page
+        after the first ends the search like a short page."""
+        found = {} if found is None else found
+        if 0 not in found:
+            found[0] = self.one_search(query=query, page=0, **kwargs)
+        total = found[0][1]
+        last = max(0, min(pages, MAX_PAGES, math.ceil(total / PAGE_SIZE)) - 1) # highest page worth asking for
+        def cut(page): # no page after this one has results
+            return min(last, page)
+        for page, (items, _) in found.items():
+            if len(items) < PAGE_SIZE:
+                last = cut(page)
+        todo = [page for page in range(1, last + 1) if page not in found]
+        if todo:
+            if self.page_pool is None:
+                self.page_pool = ThreadPoolExecutor(max(1, self.page_fanout), thread_name_prefix='cse-page')
+            running = {}
+            error = None
+            while todo or running:
+                while todo and error is None and len(running) < self.page_fanout:
+                    page = todo.pop(0)
+                    if page > last:
+                        todo = []
+                        break
+                    running[self.page_pool.submit(self.one_search, query=query, page=page, **kwargs)] = page
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    page = running.pop(future)
+                    try:
+                        found[page] = future.result()
+                    except CacheMiss:
+                        last = cut(page - 1)
+                        continue
+                    except Exception as e:
+                        error = error or e
+                        continue
+                    if len(found[page][0]) < PAGE_SIZE:
+                        last = cut(page)
+            if error is not None:
+                raise error
+        saved = []
+        for page in range(last + 1):
+            if page not in found:
+                break
+            saved.extend(found[page][0])
+        return saved, total
+
 if __name__ == '__main__':
+    import sys
     S = Searcher()
-    res = S.one_search()
-    pprint(res)
+    if len(sys.argv) > 1 and sys.argv[1] == 'export-vocab':
+        S.save_vocab()
+        print(f"wrote {S.vocab_file}")
+    else:
+        res = S.one_search()
+        pprint(res)
@@ -0,0 +1,201 @@
+"""
+Per-domain scrape memory, persisted in data/domain_memory.json: which engine worked on a domain,
+how long its pages took to load and settle, and how it failed (bot walls, timeouts, network errors).
+
+playwright_scrape.Scraper asks plan(url) before loading a page:
+    - engines: the order to try them in ('firefox' first where chromium keeps failing and firefox works;
+      'http' is left out where static_fetch always had to escalate)
+    - wait_cap: readiness wait budget per engine, from the domain's own typical wait instead of the 8s/30s caps
+    - skip: a reason when the domain failed SKIP_AFTER pages in a row and never succeeded
+Outcomes are buffered and merged into the file under a lock, so several scrape processes can share it.
+
+    python domain_memory.py             # domains that fail the most
+    python domain_memory.py forget <domain>
+"""
+import sys
+import json
+import fcntl
+import datetime
+import threading
+from pathlib import Path
+from urllib.parse import urlparse
+
+MEMORY_FILE = Path('data', 'domain_memory.json')
+FLUSH_EVERY = 20 # outcomes buffered before they are written
+SKIP_AFTER = 4 # consecutive failed pages before a domain that never worked is skipped
+RETRY_DAYS = 14 # ... and how long until it is tried again
+GIVE_UP_AFTER = 3 # failures of an engine that never worked on a domain before it is no longer tried there
+MIN_SAMPLES = 3 # successful loads before the wait budget is tuned
+MIN_WAIT_MS = 2000
+ALPHA = 0.3 # weight of the newest timing in the running averages
+BOT_WALL_WORDS = ['just a moment', 'attention required', 'verify you are human', 'are you a robot',
+                  'captcha', 'access denied', 'checking your browser', 'enable cookies']
+
+
+def domain_of(url):
+    host = urlparse(url).netloc.lower().split(':')[0]
+    return host[4:] if host.startswith('www.') else host
+
+
+def classify(error):
+    """Short failure kind for an exception raised while loading a page."""
+    text = str(error).lower()
+    if 'timeout' in text:
+        return 'timeout'
+    if any(word in text for word in ('bot wall', 'http 403', 'http 429', 'http 503', 'captcha')):
+        return 'bot wall'
+    if 'net::err_name_not_resolved' in text or 'net::err_connection' in text or 'ns_error' in text:
+        return 'network'
+    return 'error'
+
+
+def looks_like_bot_wall(data):
+    """True for an extracted page that is a challenge/interstitial rather than content."""
+    text = ' '.join(' '.join(data.get(key, [])) for key in ('headings', 'text', 'main', 'article', 'doc'))
+    return len(text) < 2000 and any(word in text.lower() for word in BOT_WALL_WORDS)
+
+
+class DomainMemory():
+    """Thread-safe; share one instance between the scrapers of a process."""
+
+    def __init__(self, path=MEMORY_FILE, flush_every=FLUSH_EVERY):
+        self.path = Path(path)
+        self.flush_every = flush_every
+        self.lock = threading.Lock()
+        self.domains = {}
+        self.pending = [] # outcomes not yet written
+        self.skipped = 0
+        self._merge()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _merge(self, change=None):
+        """Apply pending outcomes (and change(domains), if given) to the file under a lock, and reload
+        everyone else's. The caller holds self.lock or is __init__."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, 'a+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            f.seek(0)
+            text = f.read()
+            try:
+                domains = json.loads(text) if text.strip() else {}
+            except ValueError:
+                domains = {}
+            for outcome in self.pending:
+                _apply(domains, outcome)
+            if change is not None:
+                change(domains)
+            if self.pending or change is not None:
+                f.seek(0)
+                f.truncate()
+                json.dump(domains, f)
+        self.pending = []
+        self.domains = domains
+
+    def _add(self, outcome):
+        with self.lock:
+            _apply(self.domains, outcome) # visible to this process at once
+            self.pending.append(outcome)
+            if len(self.pending) >= self.flush_every:
+                self._merge()
+
+    def record(self, url, engine, ok, load_ms=None, waited_ms=None, failure=None):
+        """One engine's attempt at one page."""
+        self._add({'domain': domain_of(url), 'engine': engine, 'ok': ok, 'load_ms': load_ms,
+                   'waited_ms': waited_ms, 'failure': failure, 'day': str(datetime.date.today())})
+
+    def page_done(self, url, ok, failure=None):
+        """Final outcome for a page after every engine was tried."""
+        self._add({'domain': domain_of(url), 'page': True, 'ok': ok, 'failure': failure,
+                   'day': str(datetime.date.today())})
+
+    def plan(self, url, engines=('chromium', 'firefox'), wait_caps=None):
+        """{'engines': [...], 'wait_cap': {engine: ms}, 'skip': reason or None} for url's domain."""
+        wait_caps = dict(wait_caps or {})
+        with self.lock:
+            record = self.domains.get(domain_of(url))
+            record = json.loads(json.dumps(record)) if record else None
+        if record is None:
+            return {'engines': list(engines), 'wait_cap': wait_caps, 'skip': None}
+        stats = record.get('engines', {})
+        worked = [engine for engine in engines if stats.get(engine, {}).get('ok', 0) > 0]
+        usable = [engine for engine in engines if stats.get(engine, {}).get('ok', 0) > 0
+                  or stats.get(engine, {}).get('fail', 0) < GIVE_UP_AFTER]
+        # engines that worked here first, most reliable first; the rest keep their default order
+        order = sorted(worked, key=lambda e: -stats[e]['ok'] / (stats[e]['ok'] + stats[e].get('fail', 0)))
+        order += [engine for engine in usable if engine not in order]
+        for engine, cap in wait_caps.items():
+            engine_stats = stats.get(engine, {})
+            if engine_stats.get('ok', 0) >= MIN_SAMPLES and engine_stats.get('waited_ms') is not None:
+                wait_caps[engine] = int(min(cap, max(MIN_WAIT_MS, 2 * engine_stats['waited_ms'] + 1000)))
+        skip = None
+        if not record.get('last_ok') and record.get('streak', 0) >= SKIP_AFTER:
+            last_fail = datetime.date.fromisoformat(record['last_fail'])
+            if (datetime.date.today() - last_fail).days < RETRY_DAYS:
+                kinds = ', '.join(f"{kind} {n}" for kind, n in sorted(record.get('failures', {}).items(), key=lambda kv: -kv[1]))
+                skip = f"{record['streak']} failed pages in a row ({kinds})"
+                with self.lock:
+                    self.skipped += 1
+        if not order and skip is None: # every engine was given up on; try them all rather than nothing
+            order = list(engines)
+        return {'engines': order, 'wait_cap': wait_caps, 'skip': skip}
+
+    def flush(self):
+        with self.lock:
+            self._merge()
+
+    def forget(self, domain):
+        with self.lock:
+            self._merge(lambda domains: domains.pop(domain, None))
+
+    def close(self):
+        self.flush()
+
+    def report(self, top=20):
+        with self.lock:
+            domains = dict(self.domains)
+        worst = sorted(domains.items(), key=lambda kv: -kv[1].get('streak', 0))[:top]
+        lines = [f"{len(domains)} domains, {self.skipped} pages skipped this run"]
+        for domain, record in worst:
+            if not record.get('streak'):
+                break
+            engines = ', '.join(f"{engine} {s.get('ok', 0)}/{s.get('ok', 0) + s.get('fail', 0)}"
+                                for engine, s in record.get('engines', {}).items())
+            lines.append(f"{domain}: {record['streak']} failed in a row, {record.get('failures', {})}, ok/tried: {engines}")
+        return '\n'.join(lines)
+
+
+def _apply(domains, outcome):
+    record = domains.setdefault(outcome['domain'], {'engines': {}, 'failures': {}, 'streak': 0})
+    if outcome.get('page'):
+        if outcome['ok']:
+            record['streak'] = 0
+            record['last_ok'] = outcome['day']
+        else:
+            record['streak'] = record.get('streak', 0) + 1
+            record['last_fail'] = outcome['day']
+            kind = outcome.get('failure') or 'error'
+            record['failures'][kind] = record['failures'].get(kind, 0) + 1
+        return
+    stats = record['engines'].setdefault(outcome['engine'], {'ok': 0, 'fail': 0})
+    if not outcome['ok']:
+        stats['fail'] += 1
+        return
+    stats['ok'] += 1
+    for key in ('load_ms', 'waited_ms'):
+        if outcome.get(key) is not None:
+            old = stats.get(key)
+            stats[key] = outcome[key] if old is None else round((1 - ALPHA) * old + ALPHA * outcome[key])
+
+
+if __name__ == '__main__':
+    memory = DomainMemory()
+    if len(sys.argv) > 2 and sys.argv[1] == 'forget':
+        memory.forget(sys.argv[2])
+        print(f"forgot {sys.argv[2]}")
+    else:
+        print(memory.report())
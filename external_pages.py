@@ -12,6 +12,9 @@ from tqdm import tqdm
 from urllib.parse import urlparse
 
 import playwright_scrape as pws
+import results_journal as rj
+from page_store import PageStore
+from url_index import SeenURLs, canonicalize
 
 RESULTS_FILE = Path('data', 'external_results.json')
 PAGES_FILE = Path('data', 'external_pages.json') # dict keyed to urls in results
@@ -26,14 +29,14 @@ What: playwright scrapes all external links in search results pages
 
 def generate_external_pages_index():
     """ creates a separate list of dicts of external links and "Scraped 0/1 flag for each."""
-    with open("data/results.json",'r') as f:
-        results = json.load(f)    
-    with open("data/pages.json",'r') as f:
-        pages = json.load(f)    
+    results = rj.iter_results() # streamed, one search at a time
+    pages = PageStore(Path('data', 'pages'))
+    seen = SeenURLs(seed=pages.keys()) # pages already fetched (or queued) by any stage
+    listed = set() # canonical urls already in ext_pages
 
     missing_pages = []
     ext_pages = []
-    for idx,search in tqdm(enumerate(results), total=len(results)):
+    for idx,search in tqdm(enumerate(results), total=rj.count_results()):
         for idx2, i in enumerate(search["items"]):
             new = {                
                 "url": None,
@@ -47,17 +50,26 @@ def generate_external_pages_index():
             domain = urlparse(link).netloc
             domain = '.'.join(domain.split('.')[-2:]) # drop subdomains, if there
             if link in pages:
-                if pages[link].get('url'):
-                    urls = pages[link].get('url')
-                    for url in urls:
-                        this_domain = urlparse(link).netloc 
-                        this_domain = '.'.join(this_domain.split('.')[-2:])
-                        if this_domain != domain:
-                            new_page = new.copy()
-                            new_page['url'] = url
-                            ext_pages.append(new_page)
-                        print(this_domain, domain)
+                page = pages[link]
+                for url in page.get('ext_links') or []: # links off the result's site; 'url' holds its internal links
+                    this_domain = urlparse(url).netloc
+                    this_domain = '.'.join(this_domain.split('.')[-2:])
+                    if this_domain == domain:
+                        continue
+                    key = canonicalize(url)
+                    if key is None: # mailto:, javascript:, ...
+                        continue
+                    if key in listed:
+                        seen.saved += 1
+                        continue
+                    if seen.already_seen(url):
+                        continue
+                    listed.add(key)
+                    new_page = new.copy()
+                    new_page['url'] = url
+                    ext_pages.append(new_page)
             else:
                 missing_pages.append(link)
+    print(f"{len(ext_pages)} external pages; {seen.report()}")
     with open(PAGES_FILE,'w') as f:
         json.dump(ext_pages, f, indent=2)
\ No newline at end of file
@@ -0,0 +1,156 @@
+"""
+Fast date extraction for search results.
+
+Most dates CSE gives us are in a handful of shapes: a snippet starting "Oct 3, 2023 ...",
+"3 Oct 2023", "2 days ago", or a metatag like "2023-10-03T12:00:00+00:00". Those are matched by
+compiled patterns; only what they miss goes to dateparser, behind an LRU cache, and strings with
+nothing date-like in them never reach it.
+
+    snippet_date("Oct 3, 2023 ... The foundation announced")  # '2023-10-03'
+    metatag_date("2023-10-03T12:00:00Z")                        # '2023-10-03'
+
+    python fast_dates.py backfill [workers]   # fill missing item dates in data/results.jsonl
+"""
+import os
+import re
+import sys
+import json
+import datetime
+from functools import lru_cache
+from multiprocessing import Pool
+from pathlib import Path
+
+import results_journal as rj
+
+MONTHS = {name: number for number, names in enumerate([
+    ('jan', 'january'), ('feb', 'february'), ('mar', 'march'), ('apr', 'april'), ('may',), ('jun', 'june'),
+    ('jul', 'july'), ('aug', 'august'), ('sep', 'sept', 'september'), ('oct', 'october'),
+    ('nov', 'november'), ('dec', 'december')], 1) for name in names}
+_MONTH = r'(?P<month>' + '|'.join(sorted(MONTHS, key=len, reverse=True)) + r')\.?'
+ISO = re.compile(r'(?P<year>\d{4})-(?P<mon>\d{1,2})-(?P<day>\d{1,2})(?:[T ]|$)')
+COMPACT = re.compile(r'(?P<year>(?:19|20)\d{2})(?P<mon>\d{2})(?P<day>\d{2})$')
+MONTH_DAY_YEAR = re.compile(_MONTH + r'\s+(?P<day>\d{1,2})(?:st|nd|rd|th)?,?\s+(?P<year>\d{4})\b', re.I)
+DAY_MONTH_YEAR = re.compile(r'(?P<day>\d{1,2})(?:st|nd|rd|th)?\s+' + _MONTH + r',?\s+(?P<year>\d{4})\b', re.I)
+SLASHED = re.compile(r'(?P<a>\d{1,4})[/.](?P<b>\d{1,2})[/.](?P<c>\d{2,4})\b')
+AGO = re.compile(r'(?P<n>\d+)\s+(?P<unit>minute|min|hour|hr|day|week)s?\s+ago\b', re.I)
+MAYBE_DATE = re.compile(r'\d|\b(?:' + '|'.join(MONTHS) + r'|today|yesterday|ago)\b', re.I)
+UNITS = {'minute': 'minutes', 'min': 'minutes', 'hour': 'hours', 'hr': 'hours', 'day': 'days', 'week': 'weeks'}
+
+
+def _iso(year, month, day):
+    try:
+        return str(datetime.date(int(year), int(month), int(day)))
+    except ValueError:
+        return None
+
+
+def fast_date(text, today=None):
+    """'YYYY-MM-DD' from the common formats at the start of text, or None when none of them match."""
+    text = text.strip()
+    match = ISO.match(text) or COMPACT.match(text)
+    if match:
+        return _iso(match['year'], match['mon'], match['day'])
+    match = MONTH_DAY_YEAR.match(text)
+    if match:
+        return _iso(match['year'], MONTHS[match['month'].lower()], match['day'])
+    match = DAY_MONTH_YEAR.match(text)
+    if match:
+        return _iso(match['year'], MONTHS[match['month'].lower()], match['day'])
+    match = SLASHED.match(text)
+    if match:
+        a, b, c = match['a'], match['b'], match['c']
+        if len(a) == 4:
+            return _iso(a, b, c) # 2023/10/03
+        if len(c) == 4:
+            return _iso(c, a, b) # 10/03/2023, month first like dateparser's default
+    match = AGO.match(text)
+    if match:
+        today = today or datetime.datetime.now()
+        return str((today - datetime.timedelta(**{UNITS[match['unit'].lower()]: int(match['n'])})).date())
+    return None
+
+
+@lru_cache(maxsize=65536)
+def _dateparser(text, today):
+    """dateparser fallback; today is part of the cache key so relative dates ('yesterday') stay correct."""
+    import dateparser
+    try:
+        parsed = dateparser.parse(text)
+    except Exception:
+        return None
+    return str(parsed.date()) if parsed else None
+
+
+def parse_date(text):
+    """'YYYY-MM-DD' or None: compiled patterns first, then the cached dateparser for anything date-like."""
+    if not text:
+        return None
+    text = str(text)
+    found = fast_date(text)
+    if found or not MAYBE_DATE.search(text):
+        return found
+    return _dateparser(text, str(datetime.date.today()))
+
+
+def snippet_date(snippet):
+    """Date at the start of a CSE snippet (its first three words, as before)."""
+    return parse_date(' '.join(str(snippet or '').split()[:3]))
+
+
+def metatag_date(value):
+    """Normalized date from a metatags 'date' or 'article:published_time' value; the raw value if it can't be parsed."""
+    return parse_date(value) or value
+
+
+def _backfill_line(line):
+    """Runs in a worker: fill missing item dates of one journal line. Returns (line, items dated)."""
+    try:
+        record = json.loads(line)
+    except json.JSONDecodeError:
+        return line, 0 # compact() drops these; leave them alone here
+    filled = 0
+    for item in record.get('items', []):
+        if item.get('date'):
+            continue
+        date = snippet_date(item.get('text') or item.get('text_snippet'))
+        if date:
+            item['date'] = date
+            filled += 1
+    return (json.dumps(record, separators=(',', ':')) + '\n' if filled else line), filled
+
+
+def backfill(path=rj.RESULTS_JOURNAL, workers=None, chunksize=256):
+    """Date the items of the results journal that have none, across `workers` processes (default: all cores).
+    The journal is rewritten and swapped in atomically; lines appended while this runs are carried over
+    under results_journal.journal_lock."""
+    path = Path(path)
+    tmp = path.with_suffix(path.suffix + '.tmp')
+    size = path.stat().st_size
+    done = {'offset': 0}
+    def lines(src):
+        for raw in src:
+            if done['offset'] >= size or not raw.endswith(b'\n'):
+                break # written after we started (or still being written): copied as is below
+            done['offset'] += len(raw)
+            if raw.strip():
+                yield raw.decode('utf-8')
+    total = 0
+    with open(path, 'rb') as src, open(tmp, 'w') as dst, Pool(workers or os.cpu_count()) as pool:
+        for line, filled in pool.imap(_backfill_line, lines(src), chunksize=chunksize):
+            dst.write(line)
+            total += filled
+        with rj.journal_lock(path), open(path, 'rb') as late: # no appends between this copy and the swap
+            late.seek(done['offset']) # appended by a running search loop since we started
+            dst.write(late.read().decode('utf-8'))
+            dst.flush()
+            os.fsync(dst.fileno())
+            os.replace(tmp, path)
+    print(f"backfill: dated {total} items in {path}")
+    return total
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == 'backfill':
+        backfill(workers=int(sys.argv[2]) if len(sys.argv) > 2 else None)
+    else:
+        print("usage: python fast_dates.py backfill [workers]")
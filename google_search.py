@@ -1,33 +1,65 @@
+import sys
+import time
 import datetime
+import threading
 from googleapiclient.discovery import build
-import random
+import httplib2
 import json
-import dateparser
+from googleapiclient.errors import HttpError
+from cse_cache import ResponseCache, CacheMiss, TTL
+from quota import KeyPool, is_quota_error, DAILY_LIMIT
+from fast_dates import snippet_date, metatag_date
+
+# the only parts of a CSE response that process_search_results (and total_n) read; see search_google(fields=...)
+RESULT_FIELDS = ('queries/request/searchTerms,searchInformation(totalResults,searchTime),'
+                 'items(link,title,snippet,htmlSnippet,pagemap/metatags)')
+HTTP_TIMEOUT = 30
 
 class GoogleSearch():
     """Helper class for running automated negative news searches"""
 
-    def __init__(self):
+    def __init__(self, cache=True, ttl=TTL, offline=False, on_request=None):
+        """cache: keep raw responses in data/cse_cache (cse_cache.ResponseCache) and answer repeats from it
+        offline: answer only from the cache, raising cse_cache.CacheMiss for anything else
+        on_request: called before every request that goes to the API (not for cache hits), e.g. QuotaScheduler.acquire"""
         # Load Google API key from file
         # NOTE THAT THIS KEY HAS A IP RESTRICTION 
         # custom search engine that's configured to search the whole web
         with open('credentials.json','r') as f:
             creds = json.load(f)
-        self.api_key = [creds['GOOGLE_CSE_API_KEY']]
+        # one key, or several as a list (GOOGLE_CSE_API_KEY or GOOGLE_CSE_API_KEYS); calls are spread over them
+        keys = creds.get('GOOGLE_CSE_API_KEYS') or creds['GOOGLE_CSE_API_KEY']
+        self.api_key = [keys] if isinstance(keys, str) else list(keys)
+        self.keys = KeyPool(self.api_key, daily_limit=creds.get('GOOGLE_CSE_DAILY_LIMIT', DAILY_LIMIT))
         self.search_engine_id= creds['GOOGLE_SEARCH_ENGINE_ID']
         self.__version__ = "1.1.0"
+        self.local = threading.local() # per thread: api key -> customsearch client, built once and reused
+        self.cache = ResponseCache(ttl=ttl) if cache is True else (cache or None)
+        self.offline = offline
+        self.on_request = on_request
+        if offline and self.cache is None:
+            raise ValueError("offline mode needs the response cache")
+
+    def service(self, key):
+        """Long-lived client for one API key, with one httplib2 connection kept alive between calls.
+        httplib2 connections are not thread-safe, so each thread gets its own clients."""
+        services = self.local.__dict__.setdefault('services', {})
+        if key not in services:
+            services[key] = build("customsearch", "v1", developerKey=key,
+                                  http=httplib2.Http(timeout=HTTP_TIMEOUT))
+        return services[key]
 
 
-    def search_google(self, query_string, filetype='rss', language='lang_en', page=0, timeframe=None, dateRestrict=None):
+    def search_google(self, query_string, filetype='rss', language='lang_en', page=0, timeframe=None, dateRestrict=None,
+                      fields=RESULT_FIELDS):
         """Get first page of raw search results (10 by default) from CSE API
         docs: https://developers.google.com/custom-search/json-api/v1/reference/cse/list
         filetype: https://support.google.com/webmasters/answer/35287
         RELEVANT filetypes: pdf, rss, xls, xlsx, doc, docx, rtf
         THIS VERSION allows multiple filetypes, if passing in a list. See: https://stackoverflow.com/questions/18901738/multiple-file-types-search-using-google-custom-search-api
         you have to append it as string to main part. (cannot pass in a dict with redundand keys)
+        fields: partial response selector (RESULT_FIELDS); None fetches the full response
         """
-        KEY = random.choice(self.api_key)
-        service = build("customsearch", "v1", developerKey=KEY)
         params = dict(
             q=query_string,
             cx=self.search_engine_id)        
@@ -47,10 +79,33 @@ class GoogleSearch():
             params['start'] = (10*page)+1
             params['num'] = 10
         # start=11 ... num=10 (for results 11-20 inclusive)
-        res = service.cse().list(**params).execute()
+        if fields is not None:
+            params['fields'] = fields
+        if self.cache is not None:
+            res = self.cache.get(params, ttl=-1 if self.offline else None)
+            if res is not None:
+                return res
+        if self.offline:
+            raise CacheMiss(f"not cached: {params}")
+        if self.on_request is not None:
+            self.on_request()
+        while True:
+            KEY = self.keys.acquire() # most headroom today; waits if every key is parked
+            try:
+                res = self.service(KEY).cse().list(**params).execute()
+                break
+            except HttpError as e:
+                if not is_quota_error(e):
+                    raise
+                self.keys.park(KEY, e)
+                if self.keys.available() == 0:
+                    raise # the caller's QuotaScheduler.backoff() waits this out
+        if self.cache is not None:
+            self.cache.put(params, res)
         return res
 
-    def process_search_results(self, res):
+    @staticmethod
+    def process_search_results(res):
         """Strip out unnecessary cruft from raw results and process into simpler dict"""
         output={}
         output['search_terms']=res['queries']['request'][0]['searchTerms']
@@ -59,22 +114,16 @@ class GoogleSearch():
         output['items']=[]
         try:
             for i in res['items']:
-                try:
-                    datestring = ' '.join(i["text"].split()[:3])
-                    datestring = dateparser.parse(datestring)
-                    if datestring:
-                        datestring = str(datestring.date())
-                except Exception as e:
-                    datestring = None
+                datestring = snippet_date(i.get('snippet'))
                 item_dict={'link':i['link'],'title':i['title'],
                            'html_snippet':i['htmlSnippet'], #May not be needed
                            'text_snippet':i['snippet']}
                 if i.get('pagemap') and i['pagemap'].get('metatags') and len(i['pagemap']['metatags']) > 0:
                     if datestring == None:
                         if i['pagemap']['metatags'][0].get("date"):
-                            datestring = i['pagemap']['metatags'][0]["date"]
+                            datestring = metatag_date(i['pagemap']['metatags'][0]["date"])
                         elif i['pagemap']['metatags'][0].get('article:published_time'):
-                            datestring = i['pagemap']['metatags'][0]['article:published_time']
+                            datestring = metatag_date(i['pagemap']['metatags'][0]['article:published_time'])
                     if i['pagemap']['metatags'][0].get('og:description'):
                         item_dict['description'] = i['pagemap']['metatags'][0]['og:description']
                     elif i['pagemap']['metatags'][0].get('twitter:description'):
@@ -84,4 +133,32 @@ class GoogleSearch():
                 output['items'].append(item_dict)
         except KeyError: #can't process searches with no results
             pass
-        return output
\ No newline at end of file
+        return output
+
+def benchmark(query, n=3):
+    """Time n searches the old way (a client built per call with the library defaults, full response) against the
+    reused client with partial responses. Spends 2n queries of quota."""
+    engine = GoogleSearch()
+    key = engine.api_key[0]
+    def old():
+        service = build("customsearch", "v1", developerKey=key)
+        return service.cse().list(q=query, cx=engine.search_engine_id, lr='lang_en').execute()
+    def new():
+        return engine.service(key).cse().list(q=query, cx=engine.search_engine_id, lr='lang_en',
+                                              fields=RESULT_FIELDS).execute()
+    for name, call in (('per-call client, full response', old), ('reused client, fields=', new)):
+        seconds, size = [], 0
+        for _ in range(n):
+            start = time.perf_counter()
+            res = call()
+            seconds.append(time.perf_counter() - start)
+            size += len(json.dumps(res))
+        print(f"{name}: mean {sum(seconds) / n:.3f}s (first {seconds[0]:.3f}s), {size // n} bytes per response")
+
+
+if __name__ == '__main__':
+    # python google_search.py benchmark "<query>" [n]
+    if len(sys.argv) > 2 and sys.argv[1] == 'benchmark':
+        benchmark(sys.argv[2], int(sys.argv[3]) if len(sys.argv) > 3 else 3)
+    else:
+        print('usage: python google_search.py benchmark "<query>" [n]')
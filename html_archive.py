@@ -0,0 +1,137 @@
+"""
+Raw HTML archive: the HTML each scrape extracted from (the rendered DOM for browser pages, the
+response body for static_fetch pages), gzipped and content-addressed, so extraction changes can be
+re-run over every page without the network or a browser.
+
+Layout under `data/html/`:
+    ab/abcdef....html.gz   one file per distinct HTML (named by its sha256); identical pages are stored once
+    index.jsonl            one line per capture: {"url", "sha256", "date", "engine", "bytes"}; the last line for a url wins
+
+    python html_archive.py count
+    python html_archive.py reextract [workers]             # -> data/pages_reextracted/ (a PageStore)
+    python html_archive.py reextract [workers] --in-place  # -> data/pages/
+"""
+import os
+import sys
+import gzip
+import json
+import fcntl
+import hashlib
+import datetime
+import threading
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+ARCHIVE_DIR = Path('data', 'html')
+REEXTRACT_DIR = Path('data', 'pages_reextracted')
+
+
+class HtmlArchive():
+    """Append-only; writers in several threads or processes serialize on the index file. Picklable, so it
+    can be handed to scrape worker processes."""
+
+    def __init__(self, root=ARCHIVE_DIR):
+        self.root = Path(root)
+        self.index_file = self.root / 'index.jsonl'
+
+    def path(self, sha256):
+        return self.root / sha256[:2] / f"{sha256}.html.gz"
+
+    def put(self, url, html, engine=None):
+        """Archive html as the latest capture of url; returns its sha256."""
+        raw = html.encode('utf-8') if isinstance(html, str) else html
+        sha256 = hashlib.sha256(raw).hexdigest()
+        path = self.path(sha256)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            with gzip.open(tmp, 'wb', compresslevel=6) as f:
+                f.write(raw)
+            os.replace(tmp, path)
+        entry = json.dumps({'url': url, 'sha256': sha256, 'date': str(datetime.date.today()),
+                            'engine': engine, 'bytes': len(raw)}).encode('utf-8')
+        self.root.mkdir(parents=True, exist_ok=True)
+        with open(self.index_file, 'a+b') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            f.seek(0, os.SEEK_END)
+            if f.tell() > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    f.write(b'\n')
+            f.write(entry + b'\n')
+        return sha256
+
+    def entries(self):
+        """url -> latest index entry."""
+        latest = {}
+        if not self.index_file.exists():
+            return latest
+        with open(self.index_file, 'r') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                latest[entry['url']] = entry
+        return latest
+
+    def read(self, sha256):
+        with gzip.open(self.path(sha256), 'rb') as f:
+            return f.read().decode('utf-8', errors='replace')
+
+    def get(self, url, default=None):
+        entry = self.entries().get(url)
+        return self.read(entry['sha256']) if entry else default
+
+
+def _reextract_one(root, entry):
+    """Runs in a worker process: rebuild one page record from its archived HTML."""
+    from static_fetch import parse_html
+    import playwright_scrape as pws
+    try:
+        html = HtmlArchive(root).read(entry['sha256'])
+        data, _ = parse_html(html, entry['url'])
+    except Exception as e:
+        return entry['url'], None, f"{type(e).__name__}: {e}"
+    return entry['url'], pws.select_main(data), None
+
+
+def reextract(workers=None, in_place=False, root=ARCHIVE_DIR, chunksize=16):
+    """Rebuild the page record of every archived url with the current extraction code (static_fetch.parse_html
+    and playwright_scrape.select_main), across `workers` processes (default: all cores). Each record keeps the
+    'date' and 'scrape' metadata of the page it replaces."""
+    from page_store import PageStore, PAGE_STORE_DIR
+    archive = HtmlArchive(root)
+    entries = list(archive.entries().values())
+    old = PageStore(PAGE_STORE_DIR)
+    out = old if in_place else PageStore(REEXTRACT_DIR)
+    done = failed = 0
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        for url, data, error in pool.map(_reextract_one, [root] * len(entries), entries, chunksize=chunksize):
+            if error is not None:
+                failed += 1
+                print(f"reextract error: {url[:80]} {error}")
+                continue
+            previous = old.get(url) or {}
+            for key in ('date', 'scrape'):
+                if key in previous:
+                    data[key] = previous[key]
+            out.put(url, data)
+            done += 1
+            if done % 1000 == 0:
+                print(f"reextracted {done} of {len(entries)}")
+    print(f"reextracted {done} pages into {out.root} ({failed} failed)")
+    return done
+
+
+if __name__ == '__main__':
+    command = sys.argv[1] if len(sys.argv) > 1 else 'count'
+    if command == 'reextract':
+        numbers = [int(arg) for arg in sys.argv[2:] if arg.isdigit()]
+        reextract(workers=numbers[0] if numbers else None, in_place='--in-place' in sys.argv)
+    elif command == 'count':
+        entries = HtmlArchive().entries()
+        files = len({entry['sha256'] for entry in entries.values()})
+        print(f"{len(entries)} urls archived in {files} distinct HTML files under {ARCHIVE_DIR}")
+    else:
+        print("usage: python html_archive.py [count|reextract [workers] [--in-place]]")
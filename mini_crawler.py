@@ -26,6 +26,7 @@ import requests
 import shutil
 import random
 import logging
+from url_index import canonicalize
 # bs4 alt for clean_html https://stackoverflow.com/questions/1936466/beautifulsoup-grab-visible-webpage-text
 
 __version__ = "1.1.0"
@@ -59,6 +60,7 @@ def crawl(**kw):
    * Note: if homepage appears to have no links, it will automatically try the http version, if https. | was missing a lot of sites b/c of this
    * kw: store='mongo' to push results into mongo and return the result (_id)
    * kw: lead_source puts lead_source into mongo for tracking batches, dashboard later.
+   * kw: seen_index=True (or a url_index.SeenURLs) skips pages any other stage already fetched, comparing canonical urls.
 
 MODEL for website/archive content:
     staff-link
@@ -112,6 +114,10 @@ MODEL for website/archive content:
     index_pages = kw.get('index_pages')
     max_pages = kw.get('max_pages', 200)
     verbose = kw.get('verbose', False)
+    seen_index = kw.get('seen_index') # url_index.SeenURLs, or True for the shared data/seen_urls.txt
+    if seen_index is True:
+        from url_index import SeenURLs
+        seen_index = SeenURLs()
     overwrite = kw.get('overwrite', False) # based on fileroot
     lead_source = kw.get('lead_source', None)
     start_time = time.time()
@@ -149,16 +155,18 @@ MODEL for website/archive content:
         return
 
     print("[*] Crawl %s (depth: %d)" % (URL, depth_limit))
-    crawler = Crawler(root=url, depth_limit=depth_limit, confine_prefix=confine_prefix, exclude=exclude, index_pages=index_pages, print_pov=print_pov, archive_org=archive_org, max_pages=max_pages, verbose=verbose, gridfs=gridfs)
+    crawler = Crawler(root=url, depth_limit=depth_limit, confine_prefix=confine_prefix, exclude=exclude, index_pages=index_pages, print_pov=print_pov, archive_org=archive_org, max_pages=max_pages, verbose=verbose, gridfs=gridfs, seen_index=seen_index)
     crawler.crawl()
     if len(crawler.page_index) < 2 and url.startswith('https://'):
         url = 'http://'+url[8:]
         if confine_prefix.startswith('https://'):
             confine_prefix = 'http://'+confine_prefix[8:]
         print("[*] SWITCHING TO HTTP://%s" % (URL))
-        crawler = Crawler(root=url, depth_limit=depth_limit, confine_prefix=confine_prefix, exclude=exclude, index_pages=index_pages, print_pov=print_pov, archive_org=archive_org, max_pages=max_pages, verbose=verbose, gridfs=gridfs)
+        crawler = Crawler(root=url, depth_limit=depth_limit, confine_prefix=confine_prefix, exclude=exclude, index_pages=index_pages, print_pov=print_pov, archive_org=archive_org, max_pages=max_pages, verbose=verbose, gridfs=gridfs, seen_index=seen_index)
         crawler.crawl()
 
+    if crawler.fetches_saved:
+        crawler.log_event('[*] {0} duplicate fetches saved'.format(crawler.fetches_saved))
     # save all offsite links
     if crawler.offsite_links != set():
         crawler.log_event('[*] {0} external links not followed'.format(len(crawler.offsite_links)))
@@ -392,7 +400,7 @@ class Link (object):
 
 class Crawler(object):
 
-    def __init__(self, root=None, depth_limit=0, confine_prefix=None, exclude=[], locked=True, filter_seen=True, index_pages=True, print_pov=False, archive_org=None, max_pages=None, verbose=False, gridfs=None, store='mongo'):
+    def __init__(self, root=None, depth_limit=0, confine_prefix=None, exclude=[], locked=True, filter_seen=True, index_pages=True, print_pov=False, archive_org=None, max_pages=None, verbose=False, gridfs=None, store='mongo', seen_index=None):
         #print('DEBUG(Crawler): depth_limit {0}, confine {1}, index_pages {2}, archive_org {3}'.format(depth_limit, confine_prefix, index_pages, archive_org))
         self.root = root
         self.host = urlparse(root)[1]
@@ -403,9 +411,11 @@ class Crawler(object):
         self.exclude_prefixes=exclude  # URL prefixes NOT to visit
         self.archive_org=archive_org   # special urlparse rules apply for confine_prefix.
 
-        self.urls_seen = set()          # Used to avoid putting duplicates in queue
+        self.urls_seen = set()          # Used to avoid putting duplicates in queue (canonical urls)
         self.urls_remembered = set()    # For reporting to user
-        self.visited_links= set()       # Used to avoid re-processing a page
+        self.visited_links= set()       # Used to avoid re-processing a page (canonical urls)
+        self.seen_index = seen_index    # url_index.SeenURLs shared with other stages, or None
+        self.fetches_saved = 0          # pages skipped because an equivalent url was already fetched
         self.links_remembered = set()   # For reporting to user
 
         self.num_links = 0              # Links found (and not excluded by filters)
@@ -553,8 +563,14 @@ class Crawler(object):
         return all(prefixes_ok)
 
     def _not_visited(self, url):
-        """Pass if the URL has not already been visited"""
-        return (url not in self.visited_links)
+        """Pass if the URL (or an equivalent one) has not already been visited in this crawl"""
+        return canonicalize(url) not in self.visited_links
+
+    def _fetched_elsewhere(self, url):
+        """True if another stage sharing seen_index already fetched the URL (counted there as a saved fetch).
+        The root is always allowed, so a site can be crawled after one of its pages was scraped.
+        Only asked for URLs every other filter would follow, so the count holds fetches that were really avoided."""
+        return self.seen_index is not None and url != self.root and self.seen_index.already_seen(url)
 
     def _same_host(self, url):
         """Pass if the URL is on the same host as the root URL; treats www. as the same if missing. """
@@ -753,11 +769,17 @@ class Crawler(object):
                 #self.log_event('[*] _same_host ignored:{0}'.format(this_url))
                 self.offsite_links.add(this_url)
 
+            #A URL that would be followed but was already fetched, in this crawl or by another stage, is a saved fetch
+            if follow_this_link == True and (do_not_follow == ['_not_visited'] or
+                                             (do_not_follow == [] and self._fetched_elsewhere(this_url))):
+                self.fetches_saved += 1
             #If no filters failed (that is, all passed), process URL
-            if do_not_follow == [] and follow_this_link == True:
+            elif do_not_follow == [] and follow_this_link == True:
                 #print('--- {1} following {0} {2}'.format(this_url, depth, content))
                 try:
-                    self.visited_links.add(this_url)
+                    self.visited_links.add(canonicalize(this_url))
+                    if self.seen_index is not None:
+                        self.seen_index.add(this_url)
                     self.num_followed += 1
                     page = Fetcher(this_url, host=self.host, gridfs=self.gridfs, store=self.store, saved_file_list=self.saved_file_list)
                     page.fetch()
@@ -766,11 +788,11 @@ class Crawler(object):
                         self.page_index[(self.host, this_url, page.first_datetime)] = page.page_index
                         self.update_site_meta(page) # aggregates self.site_meta['image_index'] for finding logo and org_name
                     for link_url in [self._pre_visit_url_condense(l) for l in page.out_links()]:
-                        if link_url not in self.urls_seen:
+                        if canonicalize(link_url) not in self.urls_seen:
                             # content here is only words around link or in link. impossible to predict if the link will be full of narrative from it. hoping pronouns in link help.
                             content = self.extract_adjacent_content(link_url, page.soup)
                             q.put((link_url, depth+1, content, page.first_datetime))
-                            self.urls_seen.add(link_url)
+                            self.urls_seen.add(canonicalize(link_url))
                             report_due = True # ensures report runs only once per milestone reached
                         do_not_remember = [f for f in self.out_url_filters if not f(link_url)]
                         if [] == do_not_remember:
@@ -0,0 +1,185 @@
+"""
+Indexed, compressed store for scraped pages (replaces the monolithic data/pages.json).
+
+Layout under `data/pages/`:
+    seg-00000.dat, seg-00001.dat ...  zlib-compressed JSON page records, back to back
+    index.jsonl                       one line per record: {"u": url, "s": segment, "o": offset, "n": length}
+
+The index is loaded into a dict of url -> (segment, offset, length) when the store opens, so
+`url in store` never touches page bodies. New pages are appended to the current segment (rolled
+over at `segment_bytes`), and reads go through memory-mapped segments.
+
+    python page_store.py migrate   # data/pages.json -> data/pages/
+    python page_store.py count
+"""
+import os
+import json
+import mmap
+import zlib
+import fcntl
+import threading
+from pathlib import Path
+
+PAGE_STORE_DIR = Path('data', 'pages')
+LEGACY_PAGES_FILE = Path('data', 'pages.json')
+SEGMENT_BYTES = 256 * 1024 * 1024
+
+
+class PageStore():
+    """dict-like url -> page record store. Writers in several processes serialize on a lock file."""
+
+    def __init__(self, root=PAGE_STORE_DIR, segment_bytes=SEGMENT_BYTES):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.segment_bytes = segment_bytes
+        self.index_file = self.root / 'index.jsonl'
+        self.index = {} # url -> (segment, offset, length)
+        self._index_offset = 0 # bytes of index.jsonl already read
+        self._maps = {} # segment -> mmap
+        self._lock = threading.Lock()
+        self._load_index()
+        segments = sorted(int(p.stem.split('-')[1]) for p in self.root.glob('seg-*.dat'))
+        self.segment = segments[-1] if segments else 0
+
+    def _segment_path(self, segment):
+        return self.root / f"seg-{segment:05d}.dat"
+
+    def _load_index(self):
+        """Read index lines appended since the last call."""
+        if not self.index_file.exists():
+            return
+        with open(self.index_file, 'rb') as f:
+            if os.fstat(f.fileno()).st_size < self._index_offset: # replaced by a shorter index; start over
+                self._index_offset = 0
+            f.seek(self._index_offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break # being written by another process; read it next time
+                self._index_offset += len(line)
+                try:
+                    entry = json.loads(line)
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    continue # torn line from a crash; its record is simply not indexed
+                self.index[entry['u']] = (entry['s'], entry['o'], entry['n'])
+
+    def refresh(self):
+        """Pick up pages another process has written since the last refresh; only the new index lines are read."""
+        with self._lock:
+            self._load_index()
+
+    def __contains__(self, url):
+        return url in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def keys(self):
+        return list(self.index.keys())
+
+    def _map(self, segment, end):
+        m = self._maps.get(segment)
+        if m is None or len(m) < end: # segment has grown since it was mapped
+            if m is not None:
+                m.close()
+            with open(self._segment_path(segment), 'rb') as f:
+                m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[segment] = m
+        return m
+
+    def _read(self, segment, offset, length):
+        m = self._map(segment, offset + length)
+        return json.loads(zlib.decompress(m[offset:offset + length]))
+
+    def __getitem__(self, url):
+        segment, offset, length = self.index[url]
+        return self._read(segment, offset, length)
+
+    def get(self, url, default=None):
+        if url not in self.index:
+            return default
+        return self[url]
+
+    def items(self):
+        """Yield (url, page) lazily, in on-disk order so each segment is read front to back."""
+        for url, (segment, offset, length) in sorted(self.index.items(), key=lambda kv: kv[1]):
+            yield url, self._read(segment, offset, length)
+
+    def values(self):
+        for url, page in self.items():
+            yield page
+
+    def put(self, url, page):
+        """Append one page and its index entry. The record is fsync'd before the index line that points to it."""
+        blob = zlib.compress(json.dumps(page, separators=(',', ':')).encode('utf-8'))
+        with self._lock, open(self.root / '.lock', 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX) # released when the lock file closes
+            while self._segment_path(self.segment + 1).exists(): # another writer rolled over
+                self.segment += 1
+            path = self._segment_path(self.segment)
+            if path.exists() and path.stat().st_size + len(blob) > self.segment_bytes:
+                self.segment += 1
+                path = self._segment_path(self.segment)
+            with open(path, 'ab') as f:
+                offset = f.tell()
+                f.write(blob)
+                f.flush()
+                os.fsync(f.fileno())
+            entry = json.dumps({'u': url, 's': self.segment, 'o': offset, 'n': len(blob)}).encode('utf-8')
+            with open(self.index_file, 'a+b') as f:
+                f.seek(0, os.SEEK_END)
+                if f.tell() > 0:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b'\n':
+                        f.write(b'\n')
+                f.write(entry + b'\n')
+                f.flush()
+                os.fsync(f.fileno())
+            self.index[url] = (self.segment, offset, len(blob))
+
+    __setitem__ = put
+
+    def update(self, pages):
+        for url, page in pages.items():
+            self.put(url, page)
+
+    def close(self):
+        for m in self._maps.values():
+            m.close()
+        self._maps = {}
+
+
+def migrate_pages_json(src=LEGACY_PAGES_FILE, root=PAGE_STORE_DIR):
+    """One-shot import of the old pages.json dict into a PageStore. Pages already in the store are skipped."""
+    with open(src, 'r') as f:
+        pages = json.load(f)
+    store = PageStore(root)
+    added = 0
+    for url, page in pages.items():
+        if url in store:
+            continue
+        store.put(url, page)
+        added += 1
+    store.close()
+    print(f"migrated {added} of {len(pages)} pages from {src} to {root}")
+    return added
+
+
+def open_store(root=PAGE_STORE_DIR, legacy=LEGACY_PAGES_FILE):
+    """Open the page store, importing the legacy pages.json the first time."""
+    if not (Path(root) / 'index.jsonl').exists() and Path(legacy).exists():
+        migrate_pages_json(legacy, root)
+    return PageStore(root)
+
+
+if __name__ == '__main__':
+    import sys
+    command = sys.argv[1] if len(sys.argv) > 1 else 'count'
+    if command == 'migrate':
+        migrate_pages_json()
+    elif command == 'count':
+        print(f"{len(PageStore())} pages in {PAGE_STORE_DIR}")
+    else:
+        print("usage: python page_store.py [migrate|count]")
@@ -0,0 +1,178 @@
+"""
+PDF pipeline: PDFs are streamed to disk over plain HTTP (no browser) and turned into text in a
+process pool, with a size cap per download and a time and page limit per file. The result has the
+same shape as a playwright_scrape page record (headings, text, article, ...) so scorer and
+external_pages treat white papers like any other page.
+
+    pipeline = PdfPipeline(workers=2)
+    record = pipeline.submit(url).result()
+
+Needs `requests` and `pypdf`.
+"""
+import os
+import time
+import signal
+import hashlib
+import multiprocessing
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+import playwright_scrape as pws
+
+PDF_DIR = Path('data', 'pdfs')
+PDF_WORKERS = 2
+MAX_BYTES = 50 * 1024 * 1024
+MAX_PAGES = 60
+EXTRACT_TIMEOUT = 120 # seconds of text extraction per file
+DOWNLOAD_TIMEOUT = 60 # seconds without data before a download is abandoned
+DOWNLOAD_DEADLINE = 300 # seconds for a whole download, however slowly the server trickles it out
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/92.0.4515.131 Safari/537.36'
+
+
+class ExtractTimeout(Exception):
+    pass
+
+
+def is_pdf_url(url):
+    return str(url).lower().split('?')[0].split('#')[0].endswith('.pdf')
+
+
+def is_pdf_error(error):
+    """True for the errors a scrape raises when the url turned out to be a PDF (see playwright_scrape.Scraper)."""
+    return isinstance(error, NotImplementedError) and str(error) == 'PDF'
+
+
+def looks_like_pdf(url, timeout=15):
+    """Ask the server (HEAD, then a ranged GET if HEAD is refused) whether url serves a PDF."""
+    import requests
+    headers = {'User-Agent': USER_AGENT}
+    try:
+        res = requests.head(url, headers=headers, timeout=timeout, allow_redirects=True)
+        if res.status_code >= 400:
+            res = requests.get(url, headers=dict(headers, Range='bytes=0-1023'), timeout=timeout, stream=True)
+            res.close()
+    except Exception:
+        return False
+    return 'application/pdf' in res.headers.get('Content-Type', '').lower()
+
+
+def download(url, dest_dir=PDF_DIR, max_bytes=MAX_BYTES, timeout=DOWNLOAD_TIMEOUT):
+    """Stream url to dest_dir/<sha1 of url>.pdf in chunks; returns the path. Refuses files over max_bytes
+    and responses that are not a PDF."""
+    import requests
+    dest_dir = Path(dest_dir)
+    dest_dir.mkdir(parents=True, exist_ok=True)
+    path = dest_dir / (hashlib.sha1(url.encode('utf-8')).hexdigest() + '.pdf')
+    if path.exists():
+        return path
+    tmp = path.with_suffix('.part')
+    try:
+        with requests.get(url, headers={'User-Agent': USER_AGENT}, stream=True, timeout=timeout) as res:
+            res.raise_for_status()
+            if int(res.headers.get('Content-Length') or 0) > max_bytes:
+                raise ValueError(f"PDF too large ({res.headers['Content-Length']} bytes)")
+            size = 0
+            with open(tmp, 'wb') as f:
+                for chunk in res.iter_content(chunk_size=64 * 1024):
+                    if size == 0 and not chunk.lstrip().startswith(b'%PDF'):
+                        raise ValueError(f"not a PDF ({res.headers.get('Content-Type')})")
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise ValueError(f"PDF too large (over {max_bytes} bytes)")
+                    f.write(chunk)
+        os.replace(tmp, path)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+    return path
+
+
+def _outline_titles(outline, depth=0, max_depth=1):
+    titles = []
+    for entry in outline:
+        if isinstance(entry, list):
+            if depth < max_depth:
+                titles.extend(_outline_titles(entry, depth + 1, max_depth))
+        elif getattr(entry, 'title', None):
+            titles.append(entry.title)
+    return titles
+
+
+def pdf_record(path, max_pages=MAX_PAGES):
+    """Text of a PDF in the page record shape: headings from the title and outline, one 'text' entry
+    per page, and the whole document as 'article' (the field scorer.clean_articles reads)."""
+    from pypdf import PdfReader
+    reader = PdfReader(str(path))
+    headings = []
+    title = reader.metadata.title if reader.metadata else None
+    if title:
+        headings.append(str(title))
+    try:
+        headings.extend(_outline_titles(reader.outline))
+    except Exception:
+        pass
+    texts = []
+    for page in reader.pages[:max_pages]:
+        text = (page.extract_text() or '').strip()
+        if text:
+            texts.append(text)
+    data = {
+        'ai': [], 'headings': headings, 'text': texts, 'main': [], 'doc': [],
+        'article': ['\n'.join(texts)] if texts else [], 'banner': [], 'lists': [],
+        'url': [], 'ext_links': [],
+    }
+    data = pws.select_main(data)
+    data['scrape'] = {'engine': 'pdf', 'pages': len(reader.pages), 'pages_read': min(len(reader.pages), max_pages)}
+    return data
+
+
+def _on_alarm(signum, frame):
+    raise ExtractTimeout()
+
+
+def scrape_pdf(url, dest_dir=PDF_DIR, max_pages=MAX_PAGES, timeout=EXTRACT_TIMEOUT, max_bytes=MAX_BYTES,
+               deadline=DOWNLOAD_DEADLINE):
+    """Download and extract one PDF; runs inside a PdfPipeline worker process. The download may take up
+    to `deadline` seconds in all and the extraction `timeout` seconds."""
+    start = time.monotonic()
+    signal.signal(signal.SIGALRM, _on_alarm) # the worker's main thread, so alarms can interrupt requests and pypdf
+    signal.alarm(deadline) # the requests timeout only bounds each read, not a download trickled out byte by byte
+    try:
+        path = download(url, dest_dir, max_bytes=max_bytes)
+    except ExtractTimeout:
+        raise Exception(f"PDF download took over {deadline}s")
+    finally:
+        signal.alarm(0)
+    load_ms = round((time.monotonic() - start) * 1000)
+    signal.alarm(timeout)
+    try:
+        data = pdf_record(path, max_pages=max_pages)
+    except ExtractTimeout:
+        raise Exception(f"PDF extraction took over {timeout}s")
+    finally:
+        signal.alarm(0)
+    data['scrape'].update(load_ms=load_ms, bytes=path.stat().st_size,
+                          extract_ms=round((time.monotonic() - start) * 1000) - load_ms)
+    return data
+
+
+class PdfPipeline():
+    """Process pool for scrape_pdf. submit(url) returns a Future for the page record."""
+
+    def __init__(self, workers=PDF_WORKERS, max_pages=MAX_PAGES, timeout=EXTRACT_TIMEOUT, dest_dir=PDF_DIR):
+        self.workers = workers
+        self.kwargs = dict(dest_dir=dest_dir, max_pages=max_pages, timeout=timeout)
+        # spawn, not fork: the parent runs browser threads
+        self.pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def submit(self, url):
+        return self.pool.submit(scrape_pdf, url, **self.kwargs)
+
+    def close(self):
+        self.pool.shutdown(wait=True)
@@ -1,83 +1,530 @@
 from playwright.sync_api import sync_playwright
+import os
+import time
 import json
+import shutil
+import fcntl
+import itertools
+import threading
+from pathlib import Path
 import traceback
+from collections import Counter
+from urllib.parse import urlparse
+try:
+    import psutil # optional: enables recycling browsers on memory use
+except ImportError:
+    psutil = None
 
 junk_text = ['Skip to main content']
- 
-def main(url):
-    if str(url).lower().endswith(".pdf"):
-        raise NotImplementedError("PDF")
-    with sync_playwright() as pw:        
-        browser = pw.chromium.launch(headless=True)        
-        page = browser.new_page()
+RECYCLE_AFTER = 50 # pages per browser before it is relaunched
+MAX_BROWSER_MB = 1500 # relaunch when one Scraper's driver and browsers use more than this (needs psutil)
+WAIT_CAP_MS = {'chromium': 8000, 'firefox': 30000} # the old fixed waits are now only upper bounds
+QUIET_MS = 500 # DOM counts as settled after this long without mutations
+BROWSER_CACHE_DIR = Path('data', 'browser_cache') # persistent profiles, one per running browser
+CACHE_MB = 300 # disk cache cap per profile, enforced by the browser itself
+CACHE_TOTAL_MB = 3000 # prune_cache() removes least recently used idle profiles beyond this
+BLOCK_TYPES = ('image', 'media', 'font')
+TRACKER_DOMAINS = ['google-analytics.com', 'googletagmanager.com', 'googlesyndication.com', 'doubleclick.net',
+                   'googleadservices.com', 'facebook.net', 'connect.facebook.net', 'hotjar.com', 'segment.io',
+                   'segment.com', 'mixpanel.com', 'hs-analytics.net', 'hs-scripts.com', 'hsforms.net',
+                   'optimizely.com', 'newrelic.com', 'nr-data.net', 'quantserve.com', 'scorecardresearch.com',
+                   'adsrvr.org', 'taboola.com', 'outbrain.com', 'clarity.ms', 'ads-twitter.com',
+                   'bat.bing.com', 'px.ads.linkedin.com', 'snap.licdn.com', 'crazyegg.com', 'fullstory.com',
+                   'intercom.io', 'addthis.com', 'sharethis.com', 'criteo.com', 'amazon-adsystem.com']
+SCRIPT_CDNS = ['cdnjs.cloudflare.com', 'cdn.jsdelivr.net', 'unpkg.com', 'ajax.googleapis.com',
+               'code.jquery.com', 'cloudfront.net', 'wp.com', 'squarespace.com', 'wixstatic.com']
+# rough transfer sizes, since a blocked request never reports its own size
+EST_BYTES = {'image': 60000, 'media': 500000, 'font': 40000, 'script': 30000, 'stylesheet': 15000}
+CONTENT_SELECTOR = "article, main, [role=main], [role=article], [role=document], p"
+SETTLE_JS = """([quietMs, maxMs]) => new Promise(resolve => {
+    const done = () => { observer.disconnect(); resolve(); };
+    let timer = setTimeout(done, quietMs);
+    const observer = new MutationObserver(() => { clearTimeout(timer); timer = setTimeout(done, quietMs); });
+    observer.observe(document.documentElement || document, {subtree: true, childList: true, characterData: true});
+    setTimeout(done, maxMs);
+})"""
+
+
+EXTRACT_JS = """() => {
+    // computed ARIA role, as Playwright's get_by_role sees it: explicit role attribute first, else implicit by tag
+    const sectioning = 'article, aside, main, nav, section';
+    const implicitRole = el => {
+        const tag = el.tagName;
+        if (/^H[1-6]$/.test(tag)) return 'heading';
+        if (tag === 'UL' || tag === 'OL' || tag === 'MENU') return 'list';
+        if (tag === 'MAIN') return 'main';
+        if (tag === 'ARTICLE') return 'article';
+        if (tag === 'HEADER' && !el.parentElement?.closest(sectioning)) return 'banner';
+        return null;
+    };
+    const role = el => {
+        const explicit = (el.getAttribute('role') || '').trim().split(/\\s+/)[0];
+        return explicit || implicitRole(el);
+    };
+    const hiddenForAria = el => {
+        if (el.closest('[aria-hidden="true"]')) return true;
+        const style = getComputedStyle(el);
+        if (style.visibility !== 'visible') return true;
+        return el.getClientRects().length === 0 && style.display !== 'contents';
+    };
+    const visible = el => {
+        const rect = el.getBoundingClientRect();
+        return rect.width > 0 && rect.height > 0 && getComputedStyle(el).visibility !== 'hidden';
+    };
+    const byRole = {heading: [], list: [], main: [], document: [], article: [], banner: [], p: []};
+    const ai = [];
+    const norm = text => (text || '').replace(/\\s+/g, ' ').trim();
+    for (const el of document.querySelectorAll('*')) {
+        const r = role(el);
+        if (r in byRole && !hiddenForAria(el)) byRole[r].push(el.innerText);
+        // get_by_text(" AI ", exact=True): text is exactly "AI" and no child element already matches
+        if (norm(el.textContent) === 'AI' && !Array.from(el.children).some(c => norm(c.textContent) === 'AI')
+                && !['SCRIPT', 'STYLE', 'HEAD'].includes(el.tagName))
+            ai.push(el.innerText);
+    }
+    const internal = Array.from(document.querySelectorAll("a[href^='/']"), a => a.href);
+    const internalSet = new Set(internal);
+    const external = Array.from(document.querySelectorAll('a[href]'))
+        .filter(visible).map(a => a.href).filter(href => !internalSet.has(href));
+    return {
+        ai: ai,
+        headings: byRole.heading,
+        text: byRole.p,
+        main: byRole.main,
+        doc: byRole.document,
+        article: byRole.article,
+        banner: byRole.banner,
+        lists: byRole.list,
+        url: [...internalSet],
+        ext_links: [...new Set(external)],
+    };
+}"""
+
+
+def extract(page):
+    """All the fields we keep from a loaded page (the return value of main), collected by one in-page script.
+    Replaces one locator round trip per field; url and ext_links come back deduplicated, in first-seen order."""
+    data = page.evaluate(EXTRACT_JS)
+    return select_main(data)
+
+
+def select_main(data):
+    """Keep only one of article/doc/main (the first with over 100 chars, most specific first) and drop empty fields."""
+    # only need one, and article most specific version
+    if len(data['article']) > 0 and len(data['article'][0]) > 100:
+        data.pop('doc')
+        data.pop('main')
+    elif len(data['doc']) > 0 and len(data['doc'][0]) > 100:
+        data.pop('main')
+        data.pop('article')
+    elif len(data['main']) > 0 and len(data['main'][0]) > 100:
+        data.pop('article')
+        data.pop('doc')
+    data = {k:v for k,v in data.items() if len(v) > 0}
+    return data
+
+
+def wait_until_ready(page, cap_ms=8000, quiet_ms=QUIET_MS):
+    """Wait until main content is in the DOM, the network is idle and DOM mutations have settled,
+    or until cap_ms has passed. Returns the milliseconds actually waited."""
+    start = time.monotonic()
+    def remaining():
+        return cap_ms - (time.monotonic() - start) * 1000
+    steps = [
+        lambda ms: page.wait_for_selector(CONTENT_SELECTOR, state='attached', timeout=ms),
+        lambda ms: page.wait_for_load_state('networkidle', timeout=ms),
+        lambda ms: page.evaluate(SETTLE_JS, [quiet_ms, ms]),
+    ]
+    for step in steps:
+        ms = remaining()
+        if ms < 1: # a playwright timeout of 0 would mean no timeout at all
+            break
+        try:
+            step(ms)
+        except Exception:
+            pass # timed out or the page navigated; go on to the next check with what is left
+    return round((time.monotonic() - start) * 1000)
+
+
+def site_of(url):
+    """Registrable part of a host, approximated as its last two labels (www.x.example.org -> example.org)."""
+    host = urlparse(url).netloc.lower().split(':')[0]
+    return '.'.join(host.split('.')[-2:])
+
+
+def _host_in(host, domains):
+    return any(host == domain or host.endswith('.' + domain) for domain in domains)
+
+
+class RoutePolicy():
+    """Request interception for scrapes: blocks resource types we never read (images, media, fonts),
+    deny-listed tracker/ad domains, and (optionally) scripts from other sites than the page's own,
+    apart from common CDNs. Documents and same-site scripts always load.
+
+    attach(context) installs it on a browser context and returns the per-page counters dict."""
+
+    def __init__(self, block_types=BLOCK_TYPES, deny_domains=TRACKER_DOMAINS,
+                 first_party_scripts_only=True, script_allow_domains=SCRIPT_CDNS):
+        self.block_types = set(block_types)
+        self.deny_domains = list(deny_domains)
+        self.first_party_scripts_only = first_party_scripts_only
+        self.script_allow_domains = list(script_allow_domains)
+
+    def reason(self, request, site):
+        """Why this request should be blocked, or None to let it through."""
+        kind = request.resource_type
+        if kind == 'document' and request.is_navigation_request() and request.frame.parent_frame is None:
+            return None
+        host = urlparse(request.url).netloc.lower().split(':')[0]
+        if _host_in(host, self.deny_domains):
+            return 'tracker'
+        if kind in self.block_types:
+            return kind
+        if (kind == 'script' and self.first_party_scripts_only and site
+                and not _host_in(host, [site]) and not _host_in(host, self.script_allow_domains)):
+            return 'third-party script'
+        return None
+
+    def attach(self, context):
+        counters = {'requests': 0, 'blocked_requests': 0, 'est_bytes_saved': 0, 'blocked': Counter()}
+        state = {'site': None}
+        def handle(route):
+            request = route.request
+            counters['requests'] += 1
+            try:
+                if request.is_navigation_request() and request.frame.parent_frame is None:
+                    state['site'] = site_of(request.url) # follows redirects of the main document
+                why = self.reason(request, state['site'])
+            except Exception:
+                why = None
+            if why is None:
+                route.continue_()
+                return
+            counters['blocked_requests'] += 1
+            counters['blocked'][why] += 1
+            counters['est_bytes_saved'] += EST_BYTES.get(request.resource_type, 5000)
+            route.abort()
+        context.route("**/*", handle)
+        return counters
+
+
+DEFAULT_POLICY = RoutePolicy()
+
+
+_DRIVER_LOCK = threading.Lock() # one Playwright driver starting at a time, so its pid can be told apart
+
+
+def _child_pids():
+    return {child.pid for child in psutil.Process(os.getpid()).children()} if psutil is not None else set()
+
+
+def start_playwright():
+    """Start a Playwright driver; returns (playwright, driver pid or None if it can't be told apart)."""
+    with _DRIVER_LOCK:
+        before = _child_pids()
+        pw = sync_playwright().start()
+        started = _child_pids() - before
+    return pw, (started.pop() if len(started) == 1 else None)
+
+
+def browser_memory_mb(driver_pid):
+    """RSS of one Playwright driver and the browsers it launched, or None without psutil or a known driver pid.
+    Other Scrapers in the same process have their own drivers and are not counted."""
+    if psutil is None or driver_pid is None:
+        return None
+    try:
+        driver = psutil.Process(driver_pid)
+        processes = [driver] + driver.children(recursive=True)
+    except psutil.Error:
+        return None
+    total = 0
+    for process in processes:
+        try:
+            total += process.memory_info().rss
+        except psutil.Error:
+            pass
+    return total / (1024 * 1024)
+
+
+def watch_cache(page, engine):
+    """Counters of responses served from the browser's disk cache on this page (Chromium only, via CDP).
+    cache_bytes_saved is the body size of those responses."""
+    counters = {'cache_responses': 0, 'cache_hits': 0, 'cache_bytes_saved': 0}
+    if engine != 'chromium':
+        return counters
+    try:
+        cdp = page.context.new_cdp_session(page)
+        cdp.send('Network.enable')
+    except Exception:
+        return counters
+    cached = set()
+    def on_response(event):
+        counters['cache_responses'] += 1
+        response = event.get('response', {})
+        if response.get('fromDiskCache') or response.get('fromPrefetchCache'):
+            counters['cache_hits'] += 1
+            cached.add(event.get('requestId'))
+    def on_data(event):
+        if event.get('requestId') in cached:
+            counters['cache_bytes_saved'] += event.get('dataLength', 0)
+    cdp.on('Network.responseReceived', on_response)
+    cdp.on('Network.dataReceived', on_data)
+    return counters
+
+
+def _dir_bytes(path):
+    return sum(f.stat().st_size for f in Path(path).rglob('*') if f.is_file())
+
+
+def prune_cache(root=BROWSER_CACHE_DIR, total_mb=CACHE_TOTAL_MB):
+    """Delete least recently used idle profiles until the profiles under root fit in total_mb. Returns bytes freed."""
+    root = Path(root)
+    if not root.exists():
+        return 0
+    profiles = sorted((p for p in root.iterdir() if p.is_dir()), key=lambda p: p.stat().st_mtime)
+    sizes = {profile: _dir_bytes(profile) for profile in profiles}
+    total = sum(sizes.values())
+    freed = 0
+    for profile in profiles:
+        if total - freed <= total_mb * 1024 * 1024:
+            break
+        with open(root / f"{profile.name}.lock", 'w') as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB) # skip profiles a browser has open
+            except BlockingIOError:
+                continue
+            shutil.rmtree(profile, ignore_errors=True)
+            freed += sizes[profile]
+    return freed
+
+
+class Scraper():
+    """Reusable scraper that keeps Chromium (and, once needed, the Firefox fallback) running between pages.
+    Every page gets a fresh browser context, so no cookies or storage carry over.
+    With cache_dir, each browser instead keeps one persistent profile whose HTTP cache is reused across
+    pages (cookies are cleared after every page). Chromium turns its cache off while requests are
+    intercepted, so the route policy is not attached in that mode; images are switched off by a
+    browser setting instead. Cache hits are counted on Chromium (through CDP).
+    A browser is relaunched after `recycle_after` pages or when this Scraper's driver and browsers pass `max_mb`.
+    With a DomainMemory, each domain starts with the engine that worked there before and its own wait budget.
+    Playwright's sync API is bound to the thread that started it: use one Scraper per thread.
+
+        with Scraper() as scraper:
+            data = scraper.scrape(url) # same dict as main(url)
+    """
+
+    def __init__(self, recycle_after=RECYCLE_AFTER, max_mb=MAX_BROWSER_MB, headless=True, route_policy=DEFAULT_POLICY,
+                 memory=None, archive=None, cache_dir=None, cache_mb=CACHE_MB):
+        self.recycle_after = recycle_after
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.cache_mb = cache_mb
+        self.cache_locks = {} # engine -> open lock file of the profile slot in use
+        self.archive = archive # optional html_archive.HtmlArchive: keeps the rendered HTML of every page
+        self.memory = memory # optional domain_memory.DomainMemory: engine order, wait budget and skips per domain
+        self.max_mb = max_mb
+        self.headless = headless
+        self.route_policy = route_policy # RoutePolicy, or None to let every request through
+        self.pw = None
+        self.driver_pid = None # this Scraper's Playwright driver, for browser_memory_mb
+        self.browsers = {} # engine name -> browser (or persistent context, with cache_dir)
+        self.pages_served = {} # engine name -> pages since launch
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _browser(self, engine):
+        if self.pw is None:
+            self.pw, self.driver_pid = start_playwright()
+        browser = self.browsers.get(engine)
+        if browser is not None and hasattr(browser, 'is_connected') and not browser.is_connected():
+            browser = None
+        if browser is not None and self._needs_recycle(engine):
+            print(f"PW recycling {engine} after {self.pages_served[engine]} pages")
+            self._close_browser(engine)
+            browser = None
+        if browser is None:
+            browser = self._launch(engine)
+            self.browsers[engine] = browser
+            self.pages_served[engine] = 0
+        return browser
+
+    def _launch(self, engine):
+        kind = getattr(self.pw, engine)
+        if self.cache_dir is None:
+            return kind.launch(headless=self.headless)
+        profile = self._claim_profile(engine)
+        cache_bytes = self.cache_mb * 1024 * 1024
+        try:
+            if engine == 'chromium':
+                args = [f"--disk-cache-size={cache_bytes}", "--blink-settings=imagesEnabled=false"]
+                return kind.launch_persistent_context(profile, headless=self.headless, args=args)
+            # playwright 1.27's launch_persistent_context takes no firefox_user_prefs; Firefox reads user.js
+            # from the profile at startup instead
+            prefs = {'browser.cache.disk.smart_size.enabled': False, 'browser.cache.disk.capacity': cache_bytes // 1024,
+                     'permissions.default.image': 2}
+            with open(Path(profile, 'user.js'), 'w') as f:
+                f.writelines(f'user_pref("{name}", {json.dumps(value)});\n' for name, value in prefs.items())
+            return kind.launch_persistent_context(profile, headless=self.headless)
+        except Exception:
+            self._release_profile(engine) # don't hold a profile slot for a browser that never started
+            raise
+
+    def _claim_profile(self, engine):
+        """A profile directory no other running browser is using (a profile can't be shared at the same time)."""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        for slot in itertools.count():
+            lock = open(self.cache_dir / f"{engine}-{slot}.lock", 'w')
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                lock.close()
+                continue
+            self.cache_locks[engine] = lock
+            profile = self.cache_dir / f"{engine}-{slot}"
+            profile.mkdir(exist_ok=True)
+            os.utime(profile) # least recently used profiles are pruned first
+            return str(profile)
+
+    def _needs_recycle(self, engine):
+        if self.pages_served.get(engine, 0) >= self.recycle_after:
+            return True
+        memory = browser_memory_mb(self.driver_pid) if self.max_mb else None
+        return memory is not None and memory > self.max_mb
+
+    def _close_browser(self, engine):
+        browser = self.browsers.pop(engine, None)
+        if browser is not None:
+            try:
+                browser.close()
+            except Exception:
+                pass
+        self._release_profile(engine)
+
+    def _release_profile(self, engine):
+        lock = self.cache_locks.pop(engine, None)
+        if lock is not None:
+            lock.close()
+
+    def _load(self, engine, url, cap_ms=None):
+        """Open url in a fresh context (or a new page of the cached profile) and wait until it is ready.
+        Returns (page, timing); hand the page to _release() when done."""
+        cap_ms = cap_ms or WAIT_CAP_MS[engine]
+        browser = self._browser(engine)
+        self.pages_served[engine] += 1
+        counters = cache = None
+        if self.cache_dir is None:
+            context = browser.new_context()
+            counters = self.route_policy.attach(context) if self.route_policy else None
+            page = context.new_page()
+        else:
+            try:
+                page = browser.new_page()
+            except Exception:
+                self._close_browser(engine) # the profile's browser is gone; relaunch next time
+                raise
+            cache = watch_cache(page, engine)
         try:
-            page.goto(url)
-            page.wait_for_timeout(8000)
-        except Exception as e:
-            print(f"PW debug {e}")            
-            #print(traceback.format_exc())
-            print(f"\nTRYING FIREFOX...\n")
-            browser.close()
+            start = time.monotonic()
+            page.goto(url, wait_until='domcontentloaded')
+            load_ms = round((time.monotonic() - start) * 1000)
+            waited_ms = wait_until_ready(page, cap_ms)
+        except Exception:
+            self._release(page)
+            raise
+        timing = {'engine': engine, 'load_ms': load_ms,
+                  'waited_ms': waited_ms, 'wait_cap_ms': cap_ms}
+        if counters is not None:
+            timing.update(counters, blocked=dict(counters['blocked']))
+        if cache is not None:
+            timing.update(cache)
+        return page, timing
+
+    def _release(self, page):
+        try:
+            if self.cache_dir is None:
+                page.context.close()
+            else:
+                page.close()
+                page.context.clear_cookies() # keep the cache, not the session
+        except Exception:
+            pass
+
+    def _plan(self, url):
+        if self.memory is None:
+            return {'engines': ['chromium', 'firefox'], 'wait_cap': dict(WAIT_CAP_MS), 'skip': None}
+        return self.memory.plan(url, ['chromium', 'firefox'], WAIT_CAP_MS)
+
+    def scrape(self, url):
+        if str(url).lower().endswith(".pdf"):
+            raise NotImplementedError("PDF")
+        plan = self._plan(url)
+        if plan['skip']:
+            raise Exception(f"Skipped: {plan['skip']}")
+        failure = None
+        for attempt, engine in enumerate(plan['engines']):
+            if attempt > 0:
+                print(f"\nTRYING {engine.upper()}...\n")
             try:
-                firefox = pw.firefox.launch(headless=True)
-                page = firefox.new_page()
-                page.goto(url)
-                page.wait_for_timeout(30000)
+                page, timing = self._load(engine, url, plan['wait_cap'].get(engine))
             except Exception as e:
-                print(f"PW debug [FIREFOX ERROR]: {e}")
+                if engine == 'chromium' and ('ERR_ABORTED' in str(e) or 'Download is starting' in str(e)):
+                    from pdf_extract import looks_like_pdf
+                    if looks_like_pdf(url): # served as a download; pdf_extract handles these
+                        raise NotImplementedError("PDF")
+                print(f"PW debug [{engine}] {e}")
                 #print(traceback.format_exc())
-                raise Exception("Unable to scrape")
-
-        #ARIA roles: checkbox, button, heading, link
-        # https://www.codeinwp.com/blog/wai-aria-roles/#gref
-        ai_text = page.get_by_text(" AI ", exact=True).all_inner_texts()
-        texts = page.get_by_role("p").all_inner_texts()
-        # "a[href^='/']" returns full links only, no-relative links
-        urls = page.eval_on_selector_all("a[href^='/']", "elements => elements.map(element => element.href)")
-        urls2 = page.eval_on_selector_all("a[href]:visible", "elements => elements.map(element => element.href)")
-        ext_links = [url for url in urls2 if url not in urls]
-        #link_locators = page.locator("a:visible") #.get_by_role('link')
-        #[link.get_attribute('href') for link in link_locators]        
-        headings = page.get_by_role("heading").all_inner_texts()
-        lists = page.get_by_role("list").all_inner_texts()
-        main = page.get_by_role("main").all_inner_texts()
-        document = page.get_by_role("document").all_inner_texts()
-        article = page.get_by_role("article").all_inner_texts()
-        banner = page.get_by_role("banner").all_inner_texts()
-        data = {
-            'ai': ai_text,
-            'headings': headings,
-            'text': texts,
-            'main': main,
-            'doc': document,
-            'article': article,
-            'banner': banner,
-            'lists': lists,            
-            'url': urls,
-            #'links': links,
-            'ext_links': ext_links,
-        }
-        # only need one, and article most specific version
-        try:
-            print(f"art {len(data['article'][0])} main {len(data['main'][0])} doc {len(data['doc'][0])}")
-        except:
-            pass        
-        if len(data['article']) > 0 and len(data['article'][0]) > 100:
-            data.pop('doc')
-            data.pop('main')
-        elif len(data['doc']) > 0 and len(data['doc'][0]) > 100:
-            data.pop('main')
-            data.pop('article')
-        elif len(data['main']) > 0 and len(data['main'][0]) > 100:
-            data.pop('article')
-            data.pop('doc')
-        data = {k:v for k,v in data.items() if len(v) > 0}
-
-        with open('dump.json', 'w') as f:
-            json.dump(data, f, indent=2)
-        browser.close()
-        return data
- 
+                failure = self._failed(url, engine, e)
+                continue
+            try:
+                data = extract(page)
+                if self.archive is not None:
+                    timing['html'] = self.archive.put(url, page.content(), engine)
+            finally:
+                self._release(page)
+            if self.memory is not None:
+                from domain_memory import looks_like_bot_wall
+                if looks_like_bot_wall(data):
+                    print(f"PW debug [{engine}] bot wall")
+                    failure = self._failed(url, engine, Exception("bot wall"))
+                    continue
+                self.memory.record(url, engine, True, timing['load_ms'], timing['waited_ms'])
+                self.memory.page_done(url, True)
+            data['scrape'] = timing # timings and blocked-request counters; see scorer.wait_report()
+            return data
+        if self.memory is not None:
+            self.memory.page_done(url, False, failure)
+        raise Exception(f"Unable to scrape ({failure})" if failure else "Unable to scrape")
+
+    def _failed(self, url, engine, error):
+        if self.memory is None:
+            return None
+        from domain_memory import classify
+        failure = classify(error)
+        self.memory.record(url, engine, False, failure=failure)
+        return failure
+
+    def close(self):
+        for engine in list(self.browsers):
+            self._close_browser(engine)
+        if self.pw is not None:
+            self.pw.stop()
+            self.pw = None
+            self.driver_pid = None
+        if self.cache_dir is not None:
+            prune_cache(self.cache_dir)
+
+
+def main(url):
+    """Scrape one url with a browser started just for it. For many urls, keep a Scraper open instead."""
+    with Scraper() as scraper:
+        data = scraper.scrape(url)
+    with open('dump.json', 'w') as f:
+        json.dump(data, f, indent=2)
+    return data
+
 if __name__ == '__main__':
    url = "https://www.gfdrr.org/region/africa"
-   main(url)
\ No newline at end of file
+   main(url)
@@ -0,0 +1,150 @@
+"""
+Query selection for controller.main: a persisted set of used queries plus a lazy, shuffled,
+resumable walk over every combination of the Searcher vocabularies.
+
+The walk visits index i -> (a*i + b) mod N, where N is the size of the space and a is coprime
+to N, so every combination comes up exactly once, in a scrambled order, without materializing
+the list. Only the position in that walk is saved (data/query_cursor.json). If the vocabularies
+change the walk starts over, and the used-query set keeps it from repeating old searches.
+"""
+import os
+import json
+import math
+import random
+import hashlib
+from pathlib import Path
+
+import results_journal as rj
+
+USED_QUERIES_FILE = Path('data', 'used_queries.txt')
+CURSOR_FILE = Path('data', 'query_cursor.json')
+
+
+def build_query(term, actor=None, AI=None, query_date=None):
+    """The query formats used by controller.main; AI is used when actors are not."""
+    if AI is not None:
+        #query = f"(AI OR 'ARTIFICIAL INTELLIGENCE') AND ({term}) inurl:.org"
+        # changed 2023-10-03
+        query = f"{AI} AND ({term}) AND (foundation OR organization)"
+    else:
+        query = f"((AI OR 'ARTIFICIAL INTELLIGENCE') AND {actor}) AND ({term})"
+        #query = f"{AI} AND {actor} AND ({term})"
+    if query_date:
+        query += query_date
+    return query
+
+
+class UsedQueries():
+    """Set of every query already searched, backed by an append-only text file (one query per line)."""
+
+    def __init__(self, path=USED_QUERIES_FILE, results_file=rj.RESULTS_JOURNAL):
+        self.path = Path(path)
+        self.queries = set()
+        if self.path.exists():
+            with open(self.path, 'r') as f:
+                self.queries.update(line.rstrip('\n') for line in f if line.strip())
+        else:
+            # first run: seed from the results journal
+            self.queries.update(result['query'] for result in rj.iter_results(results_file))
+            with open(self.path, 'w') as f:
+                f.writelines(query + '\n' for query in self.queries)
+
+    def __contains__(self, query):
+        return query in self.queries
+
+    def __len__(self):
+        return len(self.queries)
+
+    def add(self, query):
+        if query in self.queries:
+            return
+        self.queries.add(query)
+        with open(self.path, 'a') as f:
+            f.write(query + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+
+class QueryPlanner():
+    """Yields (query, actor, term, AI) for combinations not searched yet, in shuffled order.
+
+    incl_actors=True walks actors x terms; otherwise ai_synonyms x terms (the actor is not part
+    of those queries, so enumerating it too would only produce repeats).
+    """
+
+    def __init__(self, searcher, incl_actors=True, query_date=None, seed=None,
+                 used=None, cursor_file=CURSOR_FILE):
+        self.incl_actors = incl_actors
+        self.query_date = query_date
+        self.first = list(searcher.actors if incl_actors else searcher.ai_synonyms)
+        self.terms = list(searcher.terms)
+        self.used = used if used is not None else UsedQueries()
+        self.cursor_file = Path(cursor_file)
+        self.size = len(self.first) * len(self.terms)
+        self.signature = hashlib.sha1(json.dumps(
+            [incl_actors, query_date, self.first, self.terms]).encode('utf-8')).hexdigest()
+        self.position = 0
+        self.seed = seed
+        self._load_cursor()
+        rng = random.Random(self.seed)
+        self.step = self._coprime_step(rng)
+        self.offset = rng.randrange(self.size) if self.size else 0
+
+    def _load_cursor(self):
+        if self.cursor_file.exists():
+            with open(self.cursor_file, 'r') as f:
+                cursor = json.load(f)
+            if cursor.get('signature') == self.signature:
+                self.position = cursor['position']
+                self.seed = cursor['seed']
+                return
+        if self.seed is None:
+            self.seed = random.randrange(2**32)
+        self._save_cursor()
+
+    def _save_cursor(self, position=None):
+        tmp = self.cursor_file.with_suffix('.tmp')
+        with open(tmp, 'w') as f:
+            json.dump({'signature': self.signature, 'seed': self.seed,
+                       'position': self.position if position is None else position}, f)
+        os.replace(tmp, self.cursor_file)
+
+    def _coprime_step(self, rng):
+        if self.size <= 1:
+            return 1
+        while True:
+            step = rng.randrange(1, self.size)
+            if math.gcd(step, self.size) == 1:
+                return step
+
+    def _combination(self, i):
+        idx = (self.step * i + self.offset) % self.size
+        return self.first[idx // len(self.terms)], self.terms[idx % len(self.terms)]
+
+    def is_used(self, query):
+        # older records were stored without the query_date suffix
+        return query in self.used or (
+            self.query_date and query.endswith(self.query_date)
+            and query[:-len(self.query_date)] in self.used)
+
+    def next_query(self):
+        """Next unused (query, actor, term, AI), or None once the whole space has been searched."""
+        while self.position < self.size:
+            first, term = self._combination(self.position)
+            self.position += 1
+            actor, AI = (first, None) if self.incl_actors else (None, first)
+            query = build_query(term, actor=actor, AI=AI, query_date=self.query_date)
+            if self.is_used(query):
+                continue
+            # until mark_used(), a restart comes back to this same combination
+            self._save_cursor(self.position - 1)
+            return query, actor, term, AI
+        self._save_cursor()
+        return None
+
+    def remaining(self):
+        return self.size - self.position
+
+    def mark_used(self, query):
+        self.used.add(query)
+        self._save_cursor()
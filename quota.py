@@ -0,0 +1,248 @@
+"""
+Quota-aware pacing for Google CSE calls.
+
+QuotaScheduler is a token bucket for the per-minute limit plus a daily counter that is persisted
+in data/quota.json, so a restart knows how much of today's allowance is already spent. CSE quota
+resets at midnight US Pacific time. Each call to `acquire()` blocks only as long as the budget
+requires; `backoff()` handles 429/403 quota errors by waiting (until the daily reset, if the daily
+quota is gone) instead of exiting.
+
+KeyPool spreads calls over several API keys: it counts calls per key per day (data/key_quota.json),
+hands out the key with the most headroom, and parks a key that returns a quota error (until the
+reset for daily-limit errors, PARK_SECONDS otherwise).
+"""
+import os
+import time
+import json
+import fcntl
+import hashlib
+import datetime
+import threading
+from pathlib import Path
+from zoneinfo import ZoneInfo
+
+QUOTA_FILE = Path('data', 'quota.json')
+KEY_QUOTA_FILE = Path('data', 'key_quota.json')
+PARK_SECONDS = 60 # a key that hit a per-minute limit sits out this long
+DAILY_LIMIT = 100 # free tier: 100 queries per day
+PER_MINUTE = 100 # CSE default queries-per-minute limit
+RESET_TZ = ZoneInfo('America/Los_Angeles')
+MAX_BACKOFF = 15 * 60
+
+
+def quota_day(now=None):
+    """The CSE quota day (a Pacific-time date) that `now` falls in."""
+    now = now or datetime.datetime.now(tz=RESET_TZ)
+    return str(now.astimezone(RESET_TZ).date())
+
+
+def seconds_until_reset(now=None):
+    now = (now or datetime.datetime.now(tz=RESET_TZ)).astimezone(RESET_TZ)
+    tomorrow = datetime.datetime.combine(now.date() + datetime.timedelta(days=1), datetime.time(), tzinfo=RESET_TZ)
+    return max(1, int((tomorrow - now).total_seconds()) + 1)
+
+
+def is_quota_error(e):
+    """True for HttpErrors that mean 'slow down' (429) or 'out of quota' (403 rate/daily limit)."""
+    status = getattr(getattr(e, 'resp', None), 'status', None)
+    if status == 429:
+        return True
+    if status == 403:
+        text = str(e).lower()
+        return any(word in text for word in ('quota', 'ratelimit', 'rate limit', 'dailylimit', 'usagelimits'))
+    return False
+
+
+def is_daily_quota_error(e):
+    text = str(e).lower()
+    return is_quota_error(e) and ('per day' in text or 'dailylimit' in text or 'daily limit' in text)
+
+
+def _locked_update(path, change, fresh):
+    """Read-modify-write a small JSON state file under an exclusive lock (on path + '.lock'); starts over
+    from fresh() when the stored quota day is not today. The new state is written to a temp file and
+    swapped in, so a crash never leaves the file empty or half written. Returns the new state."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path.with_name(path.name + '.lock'), 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            with open(path, 'r') as f:
+                text = f.read()
+            state = json.loads(text) if text.strip() else {}
+        except FileNotFoundError:
+            state = {}
+        except ValueError:
+            print(f"quota: could not read {path}; starting it over")
+            state = {}
+        before = json.dumps(state, sort_keys=True)
+        if state.get('day') != quota_day():
+            state = fresh()
+        state = change(state) or state
+        if json.dumps(state, sort_keys=True) != before:
+            tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+            with open(tmp, 'w') as f:
+                json.dump(state, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, path)
+        return state
+
+
+class QuotaScheduler():
+
+    def __init__(self, daily_limit=DAILY_LIMIT, per_minute=PER_MINUTE, state_file=QUOTA_FILE, verbose=True):
+        self.daily_limit = daily_limit
+        self.per_minute = per_minute
+        self.state_file = Path(state_file)
+        self.verbose = verbose
+        self.tokens = float(per_minute)
+        self.last_refill = time.monotonic()
+        self.failures = 0 # consecutive quota errors, for exponential backoff
+        self.lock = threading.Lock() # acquire() is called from the page-fetch threads of daily_search.Searcher
+
+    def _update_state(self, change):
+        """Read-modify-write the persisted {day, used} record under a file lock (several searchers may share it)."""
+        return _locked_update(self.state_file, change, lambda: {'day': quota_day(), 'used': 0})
+
+    def used_today(self):
+        return self._update_state(lambda state: None)['used']
+
+    def remaining_today(self):
+        return max(0, self.daily_limit - self.used_today())
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.per_minute, self.tokens + (now - self.last_refill) * self.per_minute / 60.0)
+        self.last_refill = now
+
+    def _sleep(self, seconds, why):
+        if self.verbose:
+            print(f"quota: waiting {round(seconds)}s ({why})")
+        time.sleep(seconds)
+
+    def acquire(self, n=1):
+        """Block until n queries fit in both the per-minute bucket and today's allowance, then spend them.
+        Thread-safe: concurrent callers wait their turn."""
+        with self.lock:
+            while True:
+                spent = {}
+                def spend(state):
+                    if state['used'] + n <= self.daily_limit:
+                        state['used'] += n
+                        spent['ok'] = True
+                    return state
+                self._refill()
+                if self.tokens >= n:
+                    state = self._update_state(spend)
+                    if spent:
+                        self.tokens -= n
+                        return state['used']
+                    self._sleep(seconds_until_reset(), f"daily quota of {self.daily_limit} used")
+                    continue
+                self._sleep((n - self.tokens) * 60.0 / self.per_minute, "per-minute limit")
+
+    def succeeded(self):
+        self.failures = 0
+
+    def backoff(self, e):
+        """Wait after a quota error: until the reset for daily-limit errors, else exponentially longer each time."""
+        if is_daily_quota_error(e):
+            self._update_state(lambda state: dict(state, used=max(state['used'], self.daily_limit)))
+            self._sleep(seconds_until_reset(), "daily quota exceeded")
+            return
+        self.failures += 1
+        self.tokens = 0
+        self._sleep(min(MAX_BACKOFF, 2 ** self.failures), f"rate limited, attempt {self.failures}")
+
+
+def key_id(key):
+    """Short stable name for an API key, so the keys themselves are never written to disk or logs."""
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:10]
+
+
+class KeyPool():
+    """Hands out API keys by headroom. acquire() counts a call against the chosen key; park(key, e) takes
+    a key that answered with a quota error out of rotation. State is shared through a locked file."""
+
+    def __init__(self, keys, daily_limit=DAILY_LIMIT, state_file=KEY_QUOTA_FILE, verbose=True):
+        self.keys = list(dict.fromkeys(keys))
+        if not self.keys:
+            raise ValueError("KeyPool needs at least one API key")
+        self.ids = {key_id(key): key for key in self.keys}
+        self.daily_limit = daily_limit
+        self.state_file = Path(state_file)
+        self.verbose = verbose
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _update_state(self, change):
+        return _locked_update(self.state_file, change, lambda: {'day': quota_day(), 'used': {}, 'parked': {}})
+
+    def _usable(self, state, now):
+        return [kid for kid in self.ids
+                if state['parked'].get(kid, 0) <= now and state['used'].get(kid, 0) < self.daily_limit]
+
+    def acquire(self, block=True):
+        """The key with the most calls left today (counting this one), or None if none is usable and not block."""
+        while True:
+            picked = {}
+            def take(state):
+                now = time.time()
+                usable = self._usable(state, now)
+                if usable:
+                    kid = min(usable, key=lambda kid: state['used'].get(kid, 0))
+                    state['used'][kid] = state['used'].get(kid, 0) + 1
+                    picked['key'] = self.ids[kid]
+                else:
+                    waits = [until - now for kid, until in state['parked'].items()
+                             if kid in self.ids and until > now and state['used'].get(kid, 0) < self.daily_limit]
+                    picked['wait'] = min(waits) if waits else seconds_until_reset()
+                return state
+            self._update_state(take)
+            if 'key' in picked or not block:
+                return picked.get('key')
+            if self.verbose:
+                print(f"keys: all {len(self.keys)} keys parked or used up; waiting {round(picked['wait'])}s")
+            time.sleep(max(1, picked['wait']))
+
+    def park(self, key, e=None):
+        """Take key out of rotation after a quota error: until the daily reset for daily-limit errors
+        (and its count is set to the limit), else for PARK_SECONDS."""
+        kid = key_id(key)
+        daily = e is not None and is_daily_quota_error(e)
+        def change(state):
+            if daily:
+                state['parked'][kid] = time.time() + seconds_until_reset()
+                state['used'][kid] = max(state['used'].get(kid, 0), self.daily_limit)
+            else:
+                state['parked'][kid] = time.time() + PARK_SECONDS
+            return state
+        self._update_state(change)
+        if self.verbose:
+            print(f"keys: parked {kid} {'until the daily reset' if daily else f'for {PARK_SECONDS}s'}")
+
+    def available(self):
+        """How many keys could take a call right now."""
+        state = self._update_state(lambda state: None)
+        return len(self._usable(state, time.time()))
+
+    def report(self):
+        state = self._update_state(lambda state: None)
+        now = time.time()
+        parts = []
+        for kid in self.ids:
+            parked = ' parked' if state['parked'].get(kid, 0) > now else ''
+            parts.append(f"{kid} {state['used'].get(kid, 0)}/{self.daily_limit}{parked}")
+        return f"keys on {state['day']}: " + ', '.join(parts)
+
+
+if __name__ == '__main__':
+    Q = QuotaScheduler()
+    print(f"{Q.used_today()} of {Q.daily_limit} queries used on {quota_day()}")
+    if KEY_QUOTA_FILE.exists():
+        with open(KEY_QUOTA_FILE) as f:
+            state = json.load(f)
+        if state.get('day') == quota_day():
+            print(', '.join(f"{kid} {n}" for kid, n in state['used'].items()) + " calls per key")
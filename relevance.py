@@ -0,0 +1,102 @@
+"""
+Cheap pre-scrape relevance gate for search result items.
+
+Scores each item dict built in controller.search_loop (link, title, text, description, score)
+from what CSE already returned, before any browser time is spent on it:
+    - keyword hits in title / snippet / description
+    - the actor-match `score` set in search_loop
+    - file extension (formats neither playwright_scrape nor pdf_extract can read are skipped)
+    - domain deny list (skipped) and allow list (boosted)
+    - login / paywall wording in the snippet (penalized)
+Items scoring below `min_score` are skipped; the rest are queued with their score as priority.
+
+Defaults are in GATE_CONFIG; any key can be overridden in data/gate.json.
+"""
+import json
+from pathlib import Path
+from urllib.parse import urlparse
+
+GATE_FILE = Path('data', 'gate.json')
+GATE_CONFIG = {
+    'keywords': ['ai', 'artificial intelligence', 'machine learning', 'ml', 'deep learning',
+                 'neural network', 'generative', 'chatbot', 'gpt', 'nlp', 'natural language',
+                 'algorithm', 'predictive', 'data science', 'automation', 'ethics', 'responsible',
+                 'nonprofit', 'non-profit', 'foundation', 'philanthropy', 'charity', 'fundraising',
+                 'grant', 'social impact', 'equity', 'governance', 'privacy'],
+    'keyword_weight': 1,
+    'score_weight': 2, # bonus when search_loop found the actor's name in title/snippet
+    'skip_extensions': ['.doc', '.docx', '.ppt', '.pptx', '.xls', '.xlsx', '.zip', '.csv',
+                        '.mp3', '.mp4', '.jpg', '.png'],
+    'deny_domains': ['facebook.com', 'instagram.com', 'twitter.com', 'x.com', 'linkedin.com',
+                     'tiktok.com', 'pinterest.com', 'youtube.com', 'amazon.com', 'ebay.com'],
+    'allow_domains': ['.org', '.edu', '.int', '.gov', '.ngo'],
+    'allow_weight': 2,
+    'login_words': ['sign in', 'log in', 'login', 'subscribe to read', 'subscribers only',
+                    'create an account', 'members only', 'access denied', 'paywall'],
+    'login_weight': -3,
+    'min_score': 1,
+}
+
+
+def load_config(path=GATE_FILE):
+    config = dict(GATE_CONFIG)
+    if Path(path).exists():
+        with open(path, 'r') as f:
+            config.update(json.load(f))
+    return config
+
+
+def _domain_match(host, patterns):
+    """'example.org' matches 'example.org' and its subdomains; '.org' matches any host ending in .org"""
+    for pattern in patterns:
+        if pattern.startswith('.'):
+            if host.endswith(pattern):
+                return True
+        elif host == pattern or host.endswith('.' + pattern):
+            return True
+    return False
+
+
+def _keyword_hits(text, keywords):
+    words = f" {text} "
+    for ch in '.,;:!?()[]"\'|/':
+        words = words.replace(ch, ' ')
+    return sum(1 for keyword in keywords if f" {keyword} " in words)
+
+
+def gate_score(item, config=None):
+    """(score, reason) for one item; score None means skip outright."""
+    config = config or GATE_CONFIG
+    parsed = urlparse(item['link'])
+    host = parsed.netloc.lower().split(':')[0]
+    if host.startswith('www.'):
+        host = host[4:]
+    path = parsed.path.lower()
+    if any(path.endswith(ext) for ext in config['skip_extensions']):
+        return None, f"extension {path.rsplit('.', 1)[-1]}"
+    if _domain_match(host, config['deny_domains']):
+        return None, f"denied domain {host}"
+    text = ' '.join(str(item.get(key) or '') for key in ('title', 'text', 'description')).lower()
+    score = config['keyword_weight'] * _keyword_hits(text, config['keywords'])
+    score += config['score_weight'] * (item.get('score') or 0)
+    if _domain_match(host, config['allow_domains']):
+        score += config['allow_weight']
+    if any(word in text for word in config['login_words']):
+        score += config['login_weight']
+    if score < config['min_score']:
+        return None, f"score {score} < {config['min_score']}"
+    return score, None
+
+
+def gate(items, config=None):
+    """Split items into (kept, skipped). kept is [(score, item)] best first; skipped is [(reason, item)]."""
+    config = config or load_config()
+    kept, skipped = [], []
+    for item in items:
+        score, reason = gate_score(item, config)
+        if score is None:
+            skipped.append((reason, item))
+        else:
+            kept.append((score, item))
+    kept.sort(key=lambda pair: -pair[0])
+    return kept, skipped
@@ -0,0 +1,153 @@
+"""
+Append-only journal of search results.
+
+Each search (query, date, items, ...) is one JSON line in `data/results.jsonl`,
+so saving a result is a single append and reading history never needs the
+whole file in RAM. `data/results.json` (the old monolithic list) can be
+converted once with `migrate()`.
+
+    python results_journal.py migrate   # results.json -> results.jsonl
+    python results_journal.py compact   # drop torn lines and duplicate records
+    python results_journal.py count
+
+Appends and the rewrites (compact, fast_dates.backfill) serialize on `data/results.jsonl.lock`, so a
+rewrite can run while a search loop keeps appending.
+"""
+import os
+import json
+import fcntl
+import hashlib
+from pathlib import Path
+from contextlib import contextmanager
+
+RESULTS_JOURNAL = Path('data', 'results.jsonl')
+LEGACY_RESULTS_FILE = Path('data', 'results.json')
+
+
+@contextmanager
+def journal_lock(path=RESULTS_JOURNAL):
+    """Exclusive lock shared by append_result and anything that rewrites the journal. It lives in a
+    separate file because a rewrite replaces the journal itself."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path.with_name(path.name + '.lock'), 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
+
+def append_result(result, path=RESULTS_JOURNAL):
+    """Append one search result as a single line; flushed and fsync'd before returning."""
+    line = json.dumps(result, separators=(',', ':')).encode('utf-8')
+    with journal_lock(path), open(path, 'a+b') as f:
+        f.seek(0, os.SEEK_END)
+        if f.tell() > 0:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b'\n': # previous write was torn; start a fresh line
+                f.write(b'\n')
+        f.write(line + b'\n')
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def iter_results(path=RESULTS_JOURNAL):
+    """Lazily yield each search result dict. A torn final line (crash mid-write) is skipped."""
+    if not Path(path).exists():
+        return
+    with open(path, 'r') as f:
+        for lineno, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                print(f"results_journal: skipping unreadable line {lineno} in {path}")
+
+
+def count_results(path=RESULTS_JOURNAL):
+    """Number of searches in the journal, without parsing any of them."""
+    if not Path(path).exists():
+        return 0
+    with open(path, 'rb') as f:
+        return sum(1 for line in f if line.strip())
+
+
+def compact(path=RESULTS_JOURNAL):
+    """Rewrite the journal without unreadable lines or exact duplicate records.
+    Streams through the file and swaps the new one in atomically; only record hashes are kept in memory.
+    Lines appended meanwhile are taken in under journal_lock, just before the swap, so none are lost."""
+    path = Path(path)
+    tmp = path.with_suffix(path.suffix + '.tmp')
+    seen = set()
+    counts = {'kept': 0, 'dropped': 0}
+    def take(line):
+        line = line.strip()
+        if not line:
+            return
+        try:
+            record = json.loads(line)
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            counts['dropped'] += 1
+            return
+        canonical = json.dumps(record, sort_keys=True, separators=(',', ':'))
+        digest = hashlib.sha1(canonical.encode('utf-8')).digest()
+        if digest in seen:
+            counts['dropped'] += 1
+            return
+        seen.add(digest)
+        dst.write(json.dumps(record, separators=(',', ':')) + '\n')
+        counts['kept'] += 1
+    with open(path, 'rb') as src, open(tmp, 'w') as dst:
+        partial = b''
+        for line in src:
+            if not line.endswith(b'\n'):
+                partial = line # may still be being written; finished under the lock
+                break
+            take(line)
+        with journal_lock(path):
+            for line in src: # everything appended since the pass above
+                take(partial + line)
+                partial = b''
+            take(partial)
+            dst.flush()
+            os.fsync(dst.fileno())
+            os.replace(tmp, path)
+    kept, dropped = counts['kept'], counts['dropped']
+    print(f"compacted {path}: kept {kept}, dropped {dropped}")
+    return kept, dropped
+
+
+def migrate(src=LEGACY_RESULTS_FILE, dst=RESULTS_JOURNAL):
+    """One-shot conversion of the old results.json list into the journal. Refuses to overwrite an existing journal."""
+    if Path(dst).exists():
+        raise FileExistsError(f"{dst} already exists; not migrating over it")
+    with open(src, 'r') as f:
+        results = json.load(f)
+    tmp = Path(dst).with_suffix(Path(dst).suffix + '.tmp')
+    with open(tmp, 'w') as f:
+        for result in results:
+            f.write(json.dumps(result, separators=(',', ':')) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, dst)
+    print(f"migrated {len(results)} searches from {src} to {dst}")
+    return len(results)
+
+
+def ensure_journal(path=RESULTS_JOURNAL, legacy=LEGACY_RESULTS_FILE):
+    """Migrate the legacy results.json the first time, if there is no journal yet."""
+    if not Path(path).exists() and Path(legacy).exists():
+        migrate(legacy, path)
+
+
+if __name__ == '__main__':
+    import sys
+    command = sys.argv[1] if len(sys.argv) > 1 else 'count'
+    if command == 'migrate':
+        migrate()
+    elif command == 'compact':
+        compact()
+    elif command == 'count':
+        print(f"{count_results()} searches in {RESULTS_JOURNAL}")
+    else:
+        print("usage: python results_journal.py [migrate|compact|count]")
@@ -1,40 +1,42 @@
-import json
 from pathlib import Path
 from collections import Counter
 from tqdm import tqdm
 from pprint import pprint
 import pandas as pd
 
-PAGE_FILE = Path('data', 'pages.json')
-RESULTS_FILE = Path('data', 'results.json')
+import results_journal as rj
+from page_store import PageStore
+
+PAGE_DIR = Path('data', 'pages')
+RESULTS_FILE = rj.RESULTS_JOURNAL
 
 def score_pagerank(per_month=True, cap_at=None):
-    # load all
-    with open(RESULTS_FILE, 'r') as f:
-        res = json.load(f)
-    
+    # one streaming pass over the results journal
     if per_month:
-        for year in [2022, 2023]:
-            for month in range(1,13):
-                this_month = f"{year}-{str(month).zfill(2)}"
-                pagerank = Counter()
-                for search in res:
-                    for item in search['items']:
-                        if item['date'] != None and this_month in item['date']:
-                            pagerank[item['link']] += 1
-                print(f"Top 10 Results for {this_month}:")
-                for k,v in pagerank.most_common(10):
-                    if cap_at != None and isinstance(cap_at, int):
-                        print(f"{v} -- {k[:cap_at]}")
-                    elif cap_at == 'slack':
-                        print(f"{v} -- <{k}|{k[:60]}...>")
-                    else:
-                        print(f"{v} -- {k}")
-                print("")
+        months = [f"{year}-{str(month).zfill(2)}" for year in [2022, 2023] for month in range(1,13)]
+        pageranks = {this_month: Counter() for this_month in months}
+        for search in rj.iter_results(RESULTS_FILE):
+            for item in search['items']:
+                if item['date'] == None:
+                    continue
+                for this_month in months:
+                    if this_month in item['date']:
+                        pageranks[this_month][item['link']] += 1
+        for this_month in months:
+            pagerank = pageranks[this_month]
+            print(f"Top 10 Results for {this_month}:")
+            for k,v in pagerank.most_common(10):
+                if cap_at != None and isinstance(cap_at, int):
+                    print(f"{v} -- {k[:cap_at]}")
+                elif cap_at == 'slack':
+                    print(f"{v} -- <{k}|{k[:60]}...>")
+                else:
+                    print(f"{v} -- {k}")
+            print("")
     
     else:
         pagerank = Counter()
-        for search in res:
+        for search in rj.iter_results(RESULTS_FILE):
             for item in search['items']:
                 pagerank[item['link']] += 1
         pprint(pagerank.most_common(50))
@@ -43,8 +45,7 @@ def score_pagerank(per_month=True, cap_at=None):
 def clean_articles(cutoff=50):
     # next: detect if plain language or abbrevs/frags
     # load all
-    with open(PAGE_FILE, 'r') as f:
-        pages = json.load(f)
+    pages = PageStore(PAGE_DIR) # streamed from memory-mapped segments
     # how? look for longish-blocks of words >50 chars
     cleaned = {}
     for url,page in tqdm(pages.items(), total=len(pages)):
@@ -109,22 +110,67 @@ def sent_pipe():
     return df
 
 def tally():
-    with open(PAGE_FILE,'r') as f:
-        p = json.load(f)
-    with open(RESULTS_FILE,'r') as f:
-        r = json.load(f)
-    searches = len(r)
-    results = sum([len(i['items']) for i in r])
+    p = PageStore(PAGE_DIR)
+    searches = 0
+    results = 0
+    for search in rj.iter_results(RESULTS_FILE):
+        searches += 1
+        results += len(search['items'])
     unique_pages = len(p)
     return f"{searches} searches, {results} results, {unique_pages} unique pages"
 
+def wait_report():
+    """How long scraped pages actually waited for readiness, vs the fixed 8s/30s waits used before,
+    how many requests the route policy blocked, how many pages each tier (http, browser, pdf) served,
+    and the browser cache hit rate. Savings are measured against playwright_scrape.WAIT_CAP_MS, not the
+    per-domain caps (domain_memory) pages now record as wait_cap_ms."""
+    from playwright_scrape import WAIT_CAP_MS
+    pages = PageStore(PAGE_DIR)
+    waited = Counter()
+    counts = Counter()
+    for url, page in pages.items():
+        timing = page.get('scrape')
+        if not timing:
+            continue
+        counts['tier ' + timing['engine']] += 1
+        if 'waited_ms' not in timing:
+            continue
+        engine = timing['engine']
+        counts[engine] += 1
+        waited[engine] += timing['waited_ms']
+        waited[engine + ' cap'] += WAIT_CAP_MS.get(engine, timing['wait_cap_ms'])
+        if timing['waited_ms'] >= timing['wait_cap_ms']:
+            counts[engine + ' capped'] += 1
+        counts['requests'] += timing.get('requests', 0)
+        counts['blocked'] += timing.get('blocked_requests', 0)
+        counts['bytes saved'] += timing.get('est_bytes_saved', 0)
+        counts['cache responses'] += timing.get('cache_responses', 0)
+        counts['cache hits'] += timing.get('cache_hits', 0)
+        counts['cache bytes'] += timing.get('cache_bytes_saved', 0)
+    tiers = {key[5:]: n for key, n in counts.items() if key.startswith('tier ')}
+    lines = [f"pages by tier: {', '.join(f'{tier} {n}' for tier, n in sorted(tiers.items(), key=lambda t: -t[1]))}"] if tiers else []
+    for engine in ('chromium', 'firefox'):
+        if counts[engine] == 0:
+            continue
+        saved = waited[engine + ' cap'] - waited[engine]
+        lines.append(f"{engine}: {counts[engine]} pages, mean wait {waited[engine] / counts[engine] / 1000:.1f}s, "
+                     f"{counts[engine + ' capped']} hit the cap, {saved / 1000 / 3600:.2f}h saved vs fixed waits "
+                     f"({100 * saved / waited[engine + ' cap']:.0f}%)")
+    if counts['requests']:
+        lines.append(f"blocked {counts['blocked']} of {counts['requests']} requests "
+                     f"(~{counts['bytes saved'] / 1e9:.2f} GB not downloaded)")
+    if counts['cache responses']:
+        lines.append(f"browser cache: {counts['cache hits']} of {counts['cache responses']} responses "
+                     f"({100 * counts['cache hits'] / counts['cache responses']:.0f}%), "
+                     f"{counts['cache bytes'] / 1e6:.1f} MB served from disk")
+    return '\n'.join(lines) or "no pages with wait timings yet"
+
 def extract_named_orgs_from_pages():
     df = sent_pipe()
     
 def pages_keywords():
     stopwords = ['', 'i', 'me', 'my', 'myself', 'we', 'our', 'ours', 'ourselves', 'you', 'your', 'yours', 'yourself', 'yourselves', 'he', 'him', 'his', 'himself', 'she', 'her', 'hers', 'herself', 'it', 'its', 'itself', 'they', 'them', 'their', 'theirs', 'themselves', 'what', 'which', 'who', 'whom', 'this', 'that', 'these', 'those', 'am', 'is', 'are', 'was', 'were', 'be', 'been', 'being', 'have', 'has', 'had', 'having', 'do', 'does', 'did', 'doing', 'a', 'an', 'the', 'and', 'but', 'if', 'or', 'because', 'as', 'until', 'while', 'of', 'at', 'by', 'for', 'with', 'about', 'against', 'between', 'into', 'through', 'during', 'before', 'after', 'above', 'below', 'to', 'from', 'up', 'down', 'in', 'out', 'on', 'off', 'over', 'under', 'again', 'further', 'then', 'once', 'here', 'there', 'when', 'where', 'why', 'how', 'all', 'any', 'both', 'each', 'few', 'more', 'most', 'other', 'some', 'such', 'no', 'nor', 'not', 'only', 'own', 'same', 'so', 'than', 'too', 'very', 's', 't', 'can', 'will', 'just', 'don', 'should', 'now']
-    with open(PAGE_FILE,'r') as f:
-        p = json.load(f)
+    p = PageStore(PAGE_DIR)
     print(f"{len(p)} pages")
     junk = ["Skip to main content"]
     words = Counter()
@@ -0,0 +1,129 @@
+"""
+Durable queue of links waiting to be scraped, shared by the search and scrape stages.
+
+Backed by sqlite (data/scrape_queue.db), so any number of searcher and scraper processes can
+put and claim links at the same time, and nothing queued is lost when one of them stops.
+A link is queued once: putting a link that is already pending, claimed or done is a no-op.
+
+    python scrape_queue.py   # counts by status
+"""
+import os
+import time
+import json
+import socket
+import sqlite3
+import datetime
+from pathlib import Path
+
+QUEUE_FILE = Path('data', 'scrape_queue.db')
+MAX_ATTEMPTS = 3
+
+
+class ScrapeQueue():
+
+    def __init__(self, path=QUEUE_FILE):
+        self.path = Path(path)
+        self.conn = sqlite3.connect(str(self.path), timeout=60, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS jobs (
+            url TEXT PRIMARY KEY,
+            status TEXT NOT NULL DEFAULT 'pending',
+            added TEXT,
+            claimed_at REAL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            error TEXT,
+            meta TEXT)""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, added)")
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(jobs)")]
+        if 'claimed_by' not in columns: # queues created before claims were tagged with their owner
+            self.conn.execute("ALTER TABLE jobs ADD COLUMN claimed_by TEXT")
+        if 'priority' not in columns:
+            self.conn.execute("ALTER TABLE jobs ADD COLUMN priority REAL NOT NULL DEFAULT 0")
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+
+    def put(self, url, meta=None, priority=0):
+        """Queue a link; returns True if it was new. Higher priority links are claimed first."""
+        cur = self.conn.execute(
+            "INSERT OR IGNORE INTO jobs (url, added, meta, priority) VALUES (?, ?, ?, ?)",
+            (url, datetime.datetime.now().isoformat(), json.dumps(meta) if meta else None, priority))
+        return cur.rowcount == 1
+
+    def put_many(self, urls, meta=None, priority=0):
+        return sum(self.put(url, meta, priority) for url in urls)
+
+    def claim(self, n=1):
+        """Atomically take up to n pending links (highest priority, then oldest first) and mark them claimed."""
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = self.conn.execute(
+                "SELECT url FROM jobs WHERE status='pending' ORDER BY priority DESC, added LIMIT ?", (n,)).fetchall()
+            urls = [row[0] for row in rows]
+            self.conn.executemany(
+                "UPDATE jobs SET status='claimed', claimed_at=?, claimed_by=?, attempts=attempts+1 WHERE url=?",
+                [(time.time(), self.owner, url) for url in urls])
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        return urls
+
+    def done(self, url):
+        self.conn.execute("UPDATE jobs SET status='done', error=NULL WHERE url=?", (url,))
+
+    def fail(self, url, error, max_attempts=MAX_ATTEMPTS):
+        """Record a failed scrape; the link goes back to pending until it has used up max_attempts."""
+        self.conn.execute(
+            "UPDATE jobs SET status=CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, error=? WHERE url=?",
+            (max_attempts, str(error)[:500], url))
+
+    def release_stale(self, older_than=3600):
+        """Put links claimed more than older_than seconds ago back to pending (their scraper died)."""
+        cur = self.conn.execute(
+            "UPDATE jobs SET status='pending' WHERE status='claimed' AND claimed_at < ?",
+            (time.time() - older_than,))
+        return cur.rowcount
+
+    def release_orphaned(self):
+        """Put back links claimed by a process on this host that is no longer running (crash, OOM, Ctrl-C).
+        Call it before this process claims anything: claims already tagged with its own owner id are
+        taken to be left over from an earlier process that had the same pid."""
+        host = socket.gethostname()
+        released = 0
+        for (owner,) in self.conn.execute(
+                "SELECT DISTINCT claimed_by FROM jobs WHERE status='claimed'").fetchall():
+            if owner is None:
+                alive = False
+            else:
+                owner_host, _, pid = owner.rpartition(':')
+                if owner_host != host:
+                    continue # can't tell from here; release_stale() covers other machines
+                alive = _pid_alive(int(pid)) and owner != self.owner
+            if not alive:
+                released += self.conn.execute(
+                    "UPDATE jobs SET status='pending', attempts=MAX(attempts-1, 0) WHERE status='claimed' AND claimed_by IS ?",
+                    (owner,)).rowcount
+        return released
+
+    def status(self, url):
+        row = self.conn.execute("SELECT status FROM jobs WHERE url=?", (url,)).fetchone()
+        return row[0] if row else None
+
+    def counts(self):
+        return dict(self.conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+    def close(self):
+        self.conn.close()
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+if __name__ == '__main__':
+    print(ScrapeQueue().counts())
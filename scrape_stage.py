@@ -0,0 +1,330 @@
+"""
+Concurrent scrape stage: runs a scrape function over a batch of links with a fixed number of
+workers and a cap on simultaneous requests per host, yielding each result as soon as it finishes.
+
+    for link, content, error in scrape_many(links, workers=4, per_host=2):
+        ...
+
+By default each link runs `scrape(link)` (playwright_scrape.main, a browser per page) in a thread
+pool. For long runs pass `pool=ScraperThreads(n)`: n long-lived threads that each keep one
+playwright_scrape.Scraper, so browsers stay warm across pages and batches. `ScraperProcesses(n)`
+does the same in worker processes under a watchdog, so a hung page or crashed browser costs one
+link instead of the whole run.
+"""
+import os
+import time
+import signal
+import threading
+import multiprocessing
+from queue import Queue
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from urllib.parse import urlparse
+
+import playwright_scrape as pws
+from static_fetch import TieredScraper, STATS as TIER_STATS
+from pdf_extract import is_pdf_url, is_pdf_error
+try:
+    import psutil # optional: enables the per-worker memory limit
+except ImportError:
+    psutil = None
+
+SCRAPE_WORKERS = 4
+PER_HOST = 2
+DEADLINE = 180 # wall-clock seconds per link before its worker is killed
+MAX_WORKER_MB = 2500 # a worker and its browsers together; needs psutil
+
+
+def host_of(link):
+    return urlparse(link).netloc.lower()
+
+
+class ScraperThreads():
+    """Worker threads that each own one playwright_scrape.Scraper (Playwright objects can't cross threads).
+    With static_first each worker tries a plain HTTP fetch first (static_fetch.TieredScraper).
+    submit(link) returns a Future for the scraped dict."""
+
+    def __init__(self, workers=SCRAPE_WORKERS, static_first=False, **scraper_kwargs):
+        self.workers = workers
+        self.scraper_class = TieredScraper if static_first else pws.Scraper
+        self.scraper_kwargs = scraper_kwargs
+        self.jobs = Queue()
+        self.threads = [threading.Thread(target=self._run, daemon=True) for _ in range(workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _run(self):
+        with self.scraper_class(**self.scraper_kwargs) as scraper:
+            while True:
+                job = self.jobs.get()
+                if job is None:
+                    break
+                link, future = job
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    future.set_result(scraper.scrape(link))
+                except Exception as e:
+                    future.set_exception(e)
+
+    def submit(self, link):
+        future = Future()
+        self.jobs.put((link, future))
+        return future
+
+    def close(self):
+        for _ in self.threads:
+            self.jobs.put(None)
+        for thread in self.threads:
+            thread.join()
+
+
+class WorkerKilled(Exception):
+    """The worker scraping a link was killed (deadline, memory) or died; the link should not be retried."""
+
+
+def _worker_main(conn, static_first, memory_path, scraper_kwargs):
+    """Runs in a ScraperProcesses worker: scrape each url received on conn and send back the result."""
+    os.setsid() # own process group, so the watchdog can kill the browsers along with this process
+    signal.signal(signal.SIGINT, signal.SIG_IGN) # Ctrl-C is the parent's to handle
+    memory = None
+    if memory_path is not None:
+        from domain_memory import DomainMemory
+        memory = DomainMemory(memory_path)
+    scraper_class = TieredScraper if static_first else pws.Scraper
+    try:
+        with scraper_class(memory=memory, **scraper_kwargs) as scraper:
+            while True:
+                url = conn.recv()
+                if url is None:
+                    break
+                try:
+                    conn.send(('ok', scraper.scrape(url)))
+                except Exception as e:
+                    conn.send(('error', type(e).__name__, str(e)))
+    finally:
+        if memory is not None:
+            memory.close()
+
+
+def _rebuild_error(name, message):
+    if name == 'NotImplementedError': # scrape_stage.RoutedPool looks for NotImplementedError("PDF")
+        return NotImplementedError(message)
+    return Exception(message)
+
+
+class ScraperProcesses():
+    """Like ScraperThreads, but each scraper lives in its own process, watched by a thread in this one.
+    A worker is killed (with its browsers) and replaced when a link takes longer than `deadline`
+    seconds, when it uses more than `max_mb` (with psutil), or when it dies; that link's Future then
+    raises WorkerKilled. memory: optional domain_memory.DomainMemory; workers open their own on the
+    same file, and kills are recorded in it as failures of the link's domain."""
+
+    def __init__(self, workers=SCRAPE_WORKERS, static_first=False, deadline=DEADLINE, max_mb=MAX_WORKER_MB,
+                 memory=None, **scraper_kwargs):
+        self.workers = workers
+        self.deadline = deadline
+        self.max_mb = max_mb
+        self.memory = memory
+        self.static_first = static_first
+        self.worker_args = (static_first, str(memory.path) if memory is not None else None, scraper_kwargs)
+        self.context = multiprocessing.get_context('spawn')
+        self.restarts = Counter()
+        self.jobs = Queue()
+        self.threads = [threading.Thread(target=self._watch, daemon=True) for _ in range(workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _spawn(self):
+        conn, child_conn = self.context.Pipe()
+        process = self.context.Process(target=_worker_main, args=(child_conn,) + self.worker_args, daemon=True)
+        process.start()
+        child_conn.close()
+        return process, conn
+
+    def _kill(self, process, conn):
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            process.kill()
+        process.join(5)
+        conn.close()
+
+    def _memory_mb(self, process):
+        if psutil is None or not self.max_mb:
+            return None
+        try:
+            parent = psutil.Process(process.pid)
+            return sum(p.memory_info().rss for p in [parent] + parent.children(recursive=True)) / (1024 * 1024)
+        except psutil.Error:
+            return None
+
+    def _wait(self, process, conn):
+        """The worker's reply to the link just sent, or the reason the worker has to be killed."""
+        started = time.monotonic()
+        while True:
+            if conn.poll(1):
+                try:
+                    return conn.recv(), None
+                except (EOFError, OSError):
+                    return None, 'crash'
+            if not process.is_alive():
+                return None, 'crash'
+            if time.monotonic() - started > self.deadline:
+                return None, 'deadline'
+            memory = self._memory_mb(process)
+            if memory is not None and memory > self.max_mb:
+                return None, 'memory'
+
+    def _watch(self):
+        process, conn = self._spawn()
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+            link, future = job
+            if not future.set_running_or_notify_cancel():
+                continue
+            if not process.is_alive():
+                self.restarts['crash'] += 1
+                process, conn = self._spawn()
+            started = time.monotonic()
+            try:
+                conn.send(link)
+                reply, killed = self._wait(process, conn)
+            except (BrokenPipeError, OSError):
+                reply, killed = None, 'crash'
+            if self.static_first: # the workers' own static_fetch.STATS stay in their processes
+                ms = round((time.monotonic() - started) * 1000)
+                if reply is not None and reply[0] == 'ok':
+                    timing = reply[1].get('scrape', {})
+                    TIER_STATS.record(timing.get('engine', 'unknown'), ms, escalated=timing.get('escalated'))
+                else:
+                    TIER_STATS.record('failed', ms)
+            if killed:
+                self._kill(process, conn)
+                self.restarts[killed] += 1
+                print(f"scrape watchdog: worker killed ({killed}) on {link[:80]}")
+                if self.memory is not None:
+                    self.memory.page_done(link, False, 'timeout' if killed == 'deadline' else killed)
+                future.set_exception(WorkerKilled(f"worker {killed}" + (f" after {self.deadline}s" if killed == 'deadline' else '')))
+                process, conn = self._spawn()
+            elif reply[0] == 'ok':
+                future.set_result(reply[1])
+            else:
+                future.set_exception(_rebuild_error(reply[1], reply[2]))
+            if not killed: # leaks that build up between links: restart before the next one
+                memory = self._memory_mb(process)
+                if memory is not None and memory > self.max_mb:
+                    self.restarts['memory'] += 1
+                    self._kill(process, conn)
+                    process, conn = self._spawn()
+        try:
+            conn.send(None)
+            process.join(30)
+        except (BrokenPipeError, OSError):
+            pass
+        if process.is_alive():
+            self._kill(process, conn)
+
+    def submit(self, link):
+        future = Future()
+        self.jobs.put((link, future))
+        return future
+
+    def report(self):
+        restarts = ', '.join(f"{why} {n}" for why, n in self.restarts.most_common()) or 'none'
+        return f"scrape workers: {self.workers}, restarts: {restarts}"
+
+    def close(self):
+        for _ in self.threads:
+            self.jobs.put(None)
+        for thread in self.threads:
+            thread.join()
+
+
+class RoutedPool():
+    """Sends .pdf links straight to a pdf_extract.PdfPipeline and everything else to the browser pool.
+    A page the browser reports as a PDF download (NotImplementedError("PDF")) is passed on to the
+    PDF pipeline, and the Future resolves with that result instead."""
+
+    def __init__(self, html_pool, pdf_pool):
+        self.html_pool = html_pool
+        self.pdf_pool = pdf_pool
+        self.workers = html_pool.workers + pdf_pool.workers
+
+    def submit(self, link):
+        if is_pdf_url(link):
+            return self.pdf_pool.submit(link)
+        outer = Future()
+        outer.set_running_or_notify_cancel()
+        def chain(source):
+            def done(future):
+                error = future.exception()
+                if error is None:
+                    outer.set_result(future.result())
+                elif source == 'html' and is_pdf_error(error):
+                    try:
+                        self.pdf_pool.submit(link).add_done_callback(chain('pdf'))
+                    except Exception as e: # e.g. the pdf pool was already shut down
+                        outer.set_exception(e)
+                else:
+                    outer.set_exception(error)
+            return done
+        self.html_pool.submit(link).add_done_callback(chain('html'))
+        return outer
+
+
+def scrape_many(links, scrape=pws.main, workers=SCRAPE_WORKERS, per_host=PER_HOST, pool=None):
+    """Yield (link, content, error) in completion order; exactly one of content/error is None.
+    Links are started in the order given, except that a link waits while its host already has
+    `per_host` scrapes running and later links from other hosts go ahead of it.
+    pool: optional object with submit(link) -> Future (e.g. ScraperThreads); `scrape` is then unused."""
+    pending = deque(dict.fromkeys(links)) # drop exact duplicates, keep order
+    active = Counter() # host -> running scrapes
+    running = {} # future -> link
+    executor = None
+    if pool is None:
+        executor = ThreadPoolExecutor(max_workers=workers)
+        submit = lambda link: executor.submit(scrape, link)
+    else:
+        workers = getattr(pool, 'workers', workers)
+        submit = pool.submit
+    try:
+        while pending or running:
+            # fill free workers with the first links whose host has room
+            skipped = deque()
+            while pending and len(running) < workers:
+                link = pending.popleft()
+                host = host_of(link)
+                if active[host] >= per_host:
+                    skipped.append(link)
+                    continue
+                active[host] += 1
+                running[submit(link)] = link
+            pending.extendleft(reversed(skipped))
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                link = running.pop(future)
+                active[host_of(link)] -= 1
+                try:
+                    yield link, future.result(), None
+                except Exception as e:
+                    yield link, None, e
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True)
@@ -0,0 +1,253 @@
+"""
+HTTP-first scraping: fetch the page with a plain GET, parse the HTML into the same fields as
+playwright_scrape.extract(), and only open a browser when the page looks like it needs JavaScript
+(an empty main/article, a script-heavy shell with little text, SPA markers, or a bot wall).
+
+    with TieredScraper() as scraper:
+        data = scraper.scrape(url) # data['scrape']['engine'] is 'http', 'chromium' or 'firefox'
+    print(STATS.report())
+
+Needs `requests` and `beautifulsoup4`.
+"""
+import re
+import sys
+import json
+import time
+import threading
+from collections import Counter
+from urllib.parse import urljoin
+
+import playwright_scrape as pws
+from pdf_extract import USER_AGENT
+
+FETCH_TIMEOUT = 15
+MAX_HTML_BYTES = 5 * 1024 * 1024
+MIN_TEXT = 500 # visible body characters below which a page is assumed to be rendered client side
+SCRIPT_RATIO = 0.6 # share of the html that is inline script, above which a page counts as script-heavy
+SCRIPT_HEAVY_TEXT = 2000 # ... unless it still has this much visible text
+BROWSER_STATUS = {403, 429, 503} # bot walls and challenge pages; a real browser sometimes gets through
+SPA_MARKERS = re.compile(r'<div[^>]+id=["\'](?:root|app|__next|__nuxt|___gatsby)["\'][^>]*>\s*</div>'
+                         r'|ng-app|data-reactroot|window\.__NUXT__|window\.__INITIAL_STATE__'
+                         r'|enable javascript|javascript is required|requires javascript', re.I)
+HIDDEN_STYLE = re.compile(r'display\s*:\s*none|visibility\s*:\s*hidden', re.I)
+DROP_TAGS = ['script', 'style', 'noscript', 'template', 'head', 'svg', 'iframe']
+BLOCK_TAGS = ['address', 'article', 'aside', 'blockquote', 'br', 'dd', 'div', 'dl', 'dt', 'fieldset',
+              'figcaption', 'figure', 'footer', 'form', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'header', 'hr',
+              'li', 'main', 'nav', 'ol', 'p', 'pre', 'section', 'table', 'td', 'th', 'tr', 'ul']
+SECTIONING = {'article', 'aside', 'main', 'nav', 'section'}
+
+
+class TierStats():
+    """Thread-safe page counts and latency per tier, plus why pages were escalated to the browser."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pages = Counter()
+        self.ms = Counter()
+        self.escalated = Counter()
+
+    def record(self, tier, ms, escalated=None):
+        with self.lock:
+            self.pages[tier] += 1
+            self.ms[tier] += ms
+            if escalated:
+                self.escalated[escalated] += 1
+
+    def report(self):
+        with self.lock:
+            total = sum(self.pages.values())
+            if total == 0:
+                return "tiers: no pages yet"
+            parts = [f"{tier} {count} ({100 * count / total:.0f}%, mean {self.ms[tier] / count / 1000:.1f}s)"
+                     for tier, count in self.pages.most_common()]
+            line = f"tiers: {', '.join(parts)}"
+            if self.escalated:
+                line += " | escalated: " + ', '.join(f"{why} {n}" for why, n in self.escalated.most_common())
+            return line
+
+
+STATS = TierStats()
+
+
+def _role(tag):
+    """ARIA role as EXTRACT_JS computes it: explicit role attribute first, else implicit by tag."""
+    explicit = (tag.get('role') or '').split()
+    if explicit:
+        return explicit[0]
+    name = tag.name
+    if re.fullmatch(r'h[1-6]', name):
+        return 'heading'
+    if name in ('ul', 'ol', 'menu'):
+        return 'list'
+    if name in ('main', 'article'):
+        return name
+    if name == 'header' and not any(parent.name in SECTIONING for parent in tag.parents):
+        return 'banner'
+    return None
+
+
+def _hidden(tag):
+    return (tag.has_attr('hidden') or tag.get('aria-hidden') == 'true'
+            or bool(HIDDEN_STYLE.search(tag.get('style') or '')))
+
+
+def _inner_text(tag):
+    """Approximates innerText: line breaks between blocks, whitespace collapsed inside lines."""
+    lines = (' '.join(line.split()) for line in tag.get_text().split('\n'))
+    return '\n'.join(line for line in lines if line)
+
+
+def parse_html(html, url):
+    """The fields of playwright_scrape.extract() from static html, before select_main()."""
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, 'html.parser')
+    base = soup.find('base', href=True)
+    base = urljoin(url, base['href']) if base else url
+    for tag in soup.find_all(DROP_TAGS):
+        tag.decompose()
+    for tag in soup.find_all(_hidden):
+        tag.decompose()
+    for tag in soup.find_all(BLOCK_TAGS):
+        tag.insert_before('\n')
+        tag.insert_after('\n')
+    by_role = {'heading': [], 'list': [], 'main': [], 'document': [], 'article': [], 'banner': [], 'p': []}
+    for tag in soup.find_all(True):
+        role = _role(tag)
+        if role in by_role:
+            by_role[role].append(_inner_text(tag))
+    # get_by_text(" AI ", exact=True): the innermost element whose whole text is "AI"
+    ai = ['AI' for string in soup.find_all(string=lambda s: s.strip() == 'AI')
+          if ' '.join(string.parent.get_text().split()) == 'AI']
+    internal = list(dict.fromkeys(urljoin(base, a['href']) for a in soup.select("a[href^='/']")))
+    internal_set = set(internal)
+    external = [urljoin(base, a['href'].strip()) for a in soup.find_all('a', href=True)]
+    external = list(dict.fromkeys(href for href in external if href not in internal_set))
+    body = soup.body or soup
+    return {
+        'ai': ai,
+        'headings': by_role['heading'],
+        'text': by_role['p'],
+        'main': by_role['main'],
+        'doc': by_role['document'],
+        'article': by_role['article'],
+        'banner': by_role['banner'],
+        'lists': by_role['list'],
+        'url': internal,
+        'ext_links': external,
+    }, len(_inner_text(body))
+
+
+def needs_browser(html, data, text_chars):
+    """Why this page should be rendered in a browser instead, or None if the static parse is good enough."""
+    marker = SPA_MARKERS.search(html)
+    if text_chars < MIN_TEXT:
+        return 'spa shell' if marker else 'little text'
+    scripts = sum(len(m.group(0)) for m in re.finditer(r'<script\b.*?</script>', html, re.I | re.S))
+    if scripts / max(len(html), 1) > SCRIPT_RATIO and text_chars < SCRIPT_HEAVY_TEXT:
+        return 'script-heavy'
+    containers = data['main'] + data['article'] + data['doc']
+    if containers and max(len(text) for text in containers) <= 100:
+        return 'empty main/article'
+    return None
+
+
+def fetch(url, session=None, timeout=FETCH_TIMEOUT):
+    """GET url. Returns (html, final url, status, content type); html is None when it is not an html page."""
+    import requests
+    session = session or requests
+    with session.get(url, headers={'User-Agent': USER_AGENT}, timeout=timeout, stream=True) as res:
+        kind = res.headers.get('Content-Type', '').lower()
+        if 'html' not in kind:
+            return None, res.url, res.status_code, kind
+        body = res.raw.read(MAX_HTML_BYTES + 1, decode_content=True)
+        if len(body) > MAX_HTML_BYTES:
+            return None, res.url, res.status_code, 'too large'
+        encoding = res.encoding if 'charset' in kind else 'utf-8'
+        return body.decode(encoding, errors='replace'), res.url, res.status_code, kind
+
+
+def static_scrape(url, session=None, timeout=FETCH_TIMEOUT, archive=None):
+    """(data, None) when the plain-HTTP result is good enough, else (None, reason to use the browser).
+    Raises NotImplementedError("PDF") for PDFs, like playwright_scrape.Scraper.
+    archive: optional html_archive.HtmlArchive that keeps the HTML of pages served this way."""
+    try:
+        html, final_url, status, kind = fetch(url, session, timeout)
+    except Exception as e:
+        return None, f"fetch error {type(e).__name__}"
+    if 'application/pdf' in kind:
+        raise NotImplementedError("PDF")
+    if status in BROWSER_STATUS:
+        return None, f"http {status}"
+    if status >= 400:
+        raise Exception(f"HTTP {status}")
+    if html is None:
+        return None, f"content-type {kind.split(';')[0] or 'missing'}"
+    data, text_chars = parse_html(html, final_url)
+    reason = needs_browser(html, data, text_chars)
+    if reason:
+        return None, reason
+    data = pws.select_main(data)
+    data['scrape'] = {'engine': 'http', 'status': status, 'bytes': len(html)}
+    if archive is not None:
+        data['scrape']['html'] = archive.put(url, html, 'http')
+    return data, None
+
+
+class TieredScraper():
+    """Drop-in for playwright_scrape.Scraper: plain HTTP first, the browser only when needed.
+    The browser is launched on the first escalation. One per thread, like Scraper."""
+
+    def __init__(self, stats=STATS, timeout=FETCH_TIMEOUT, memory=None, archive=None, **scraper_kwargs):
+        import requests
+        self.stats = stats
+        self.timeout = timeout
+        self.memory = memory # optional domain_memory.DomainMemory; domains that always escalate skip the GET
+        self.archive = archive
+        self.session = requests.Session()
+        self.browser = pws.Scraper(memory=memory, archive=archive, **scraper_kwargs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def scrape(self, url):
+        start = time.monotonic()
+        elapsed = lambda: round((time.monotonic() - start) * 1000)
+        plan = self.memory.plan(url, ['http', 'chromium', 'firefox']) if self.memory else None
+        if plan and plan['skip']:
+            raise Exception(f"Skipped: {plan['skip']}")
+        if plan and 'http' not in plan['engines']:
+            data, reason = None, 'domain needs browser'
+        else:
+            data, reason = static_scrape(url, self.session, self.timeout, self.archive)
+            if self.memory:
+                self.memory.record(url, 'http', data is not None, load_ms=elapsed() if data else None)
+        if data is not None:
+            data['scrape']['load_ms'] = elapsed()
+            self.stats.record('http', data['scrape']['load_ms'])
+            if self.memory:
+                self.memory.page_done(url, True)
+            return data
+        try:
+            data = self.browser.scrape(url)
+        except Exception:
+            self.stats.record('failed', elapsed(), escalated=reason)
+            raise
+        data['scrape']['escalated'] = reason
+        self.stats.record(data['scrape']['engine'], elapsed(), escalated=reason)
+        return data
+
+    def close(self):
+        self.session.close()
+        self.browser.close()
+
+
+if __name__ == '__main__':
+    # python static_fetch.py <url>: show whether the url would be served over plain HTTP, and why not
+    data, reason = static_scrape(sys.argv[1])
+    if data is None:
+        print(f"needs browser: {reason}")
+    else:
+        print(json.dumps(data, indent=2)[:3000])
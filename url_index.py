@@ -0,0 +1,124 @@
+"""
+One URL canonicalizer and a persistent seen-URL index shared by every stage that fetches pages
+(controller search/scrape, external_pages, mini_crawler).
+
+canonicalize() maps equivalent spellings of a page to one key: http/https, `www.`, letter case of
+the host, default ports, trailing slashes, fragments, tracking parameters (utm_*, fbclid, ...) and
+query parameter order are all ignored. The key is only for comparing URLs; fetch the original.
+Non-web URLs (mailto:, tel:, javascript:, ...) have no key and are never recorded as seen.
+
+SeenURLs keeps the keys of every page already fetched or queued in data/seen_urls.txt and counts
+how many fetches it saved.
+"""
+import re
+from pathlib import Path
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+SEEN_FILE = Path('data', 'seen_urls.txt')
+TRACKING_PARAMS = {'fbclid', 'gclid', 'dclid', 'msclkid', 'mc_cid', 'mc_eid', 'igshid',
+                   '_ga', '_gl', 'ref_src', 'yclid', '_hsenc', '_hsmi', 'mkt_tok'}
+DEFAULT_PORTS = {'80', '443'}
+SCHEME = re.compile(r'([a-zA-Z][a-zA-Z0-9+.-]*):')
+HOST_PORT = re.compile(r'[a-zA-Z0-9-]+:\d{1,5}(?:[/?#]|$)') # 'localhost:8000/a', not a scheme
+NON_WEB_SCHEMES = {'mailto', 'tel', 'sms', 'javascript', 'data', 'blob', 'about', 'file', 'ftp', 'callto', 'skype'}
+
+
+def _is_web(url):
+    """False for urls with a scheme other than http/https. 'example.org:8080/a' and 'localhost:80' are a host and port."""
+    match = SCHEME.match(url)
+    if match is None or match[1].lower() in ('http', 'https'):
+        return True
+    if match[1].lower() in NON_WEB_SCHEMES:
+        return False
+    return '.' in match[1] or HOST_PORT.match(url) is not None
+
+
+def canonicalize(url):
+    """Comparison key for a URL, e.g. 'HTTP://www.Example.org:80/a/?utm_source=x&b=2&a=1#top' -> 'https://example.org/a?a=1&b=2'
+    None for an empty url or one with another scheme (mailto:, tel:, javascript:, data:, ...)."""
+    url = str(url or '').strip()
+    if not url or not _is_web(url):
+        return None
+    try:
+        parts = urlsplit(url if '//' in url else '//' + url)
+    except ValueError:
+        return url
+    host = (parts.hostname or '').lower().rstrip('.')
+    if host.startswith('www.'):
+        host = host[4:]
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    if port and str(port) not in DEFAULT_PORTS:
+        host = f"{host}:{port}"
+    path = parts.path or '/'
+    while '//' in path:
+        path = path.replace('//', '/')
+    if len(path) > 1:
+        path = path.rstrip('/')
+    query = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+                   if not k.lower().startswith('utm_') and k.lower() not in TRACKING_PARAMS)
+    return urlunsplit(('https', host, path, urlencode(query), ''))
+
+
+class SeenURLs():
+    """Persistent set of canonical URLs. `claim(url)` is the usual entry point: True means go ahead and
+    fetch it (it is now recorded), False means an equivalent URL was already fetched and counts as saved."""
+
+    def __init__(self, path=SEEN_FILE, seed=None):
+        self.path = Path(path)
+        self.keys = set()
+        self.saved = 0 # fetches skipped by this instance
+        self._offset = 0
+        if not self.path.exists() and seed is not None:
+            # first run: start from URLs already fetched elsewhere, e.g. the page store
+            with open(self.path, 'w') as f:
+                f.writelines(key + '\n' for key in {canonicalize(url) for url in seed} if key is not None)
+        self.refresh()
+
+    def refresh(self):
+        """Pick up keys other processes have appended since the last read."""
+        if not self.path.exists():
+            return
+        with open(self.path, 'rb') as f:
+            f.seek(self._offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break # partly written by another process; read it next time
+                self.keys.add(line[:-1].decode('utf-8'))
+                self._offset += len(line)
+
+    def __contains__(self, url):
+        key = canonicalize(url)
+        return key is not None and key in self.keys
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, url):
+        key = canonicalize(url)
+        if key is None or key in self.keys:
+            return False
+        self.keys.add(key)
+        with open(self.path, 'a') as f:
+            f.write(key + '\n')
+        return True
+
+    def already_seen(self, url):
+        """True if an equivalent URL was seen; each True counts as a saved fetch."""
+        if url in self:
+            self.saved += 1
+            return True
+        return False
+
+    def claim(self, url):
+        if canonicalize(url) is None:
+            return False # not a web page; nothing to fetch
+        if self.add(url):
+            return True
+        self.saved += 1
+        return False
+
+    def report(self):
+        return f"{self.saved} duplicate fetches saved, {len(self.keys)} URLs seen"